@@ -0,0 +1,3 @@
+"""
+Shared building blocks used by the agents in every task folder
+"""
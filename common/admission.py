@@ -0,0 +1,86 @@
+"""
+Admission control for LLM-bound requests: shed load with 429/503 before latency balloons
+"""
+
+import os
+import math
+import time
+import random
+from contextlib import contextmanager
+from typing import Iterator
+
+from common.metrics import get_registry
+
+DEFAULT_MAX_LLM_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_LLM_IN_FLIGHT", "64"))
+DEFAULT_LATENCY_SLO_SECONDS = float(os.getenv("ADMISSION_LATENCY_SLO_SECONDS", "5"))
+DEFAULT_MAX_SHED_RATIO = float(os.getenv("ADMISSION_MAX_SHED_RATIO", "0.9"))
+
+class OverloadedError(RuntimeError):
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """
+    Caps concurrent LLM-bound requests and sheds a growing share of them while the smoothed
+    LLM latency (queueing included) is above the SLO. Local answers never pass through here.
+    """
+    
+    def __init__(self, max_llm_in_flight: int = DEFAULT_MAX_LLM_IN_FLIGHT,
+                 latency_slo: float = DEFAULT_LATENCY_SLO_SECONDS, max_shed_ratio: float = DEFAULT_MAX_SHED_RATIO,
+                 smoothing: float = 0.2):
+        self.max_llm_in_flight = max_llm_in_flight
+        self.latency_slo = latency_slo
+        self.max_shed_ratio = max_shed_ratio
+        self.smoothing = smoothing
+        
+        self.llm_in_flight = 0
+        self.latency_ewma = 0.0
+        
+        registry = get_registry()
+        self.admitted = registry.counter("admission_admitted_total", "LLM-bound requests admitted")
+        self.shed = {
+            reason: registry.counter("admission_shed_total", "LLM-bound requests rejected by admission control", reason=reason)
+            for reason in ("concurrency", "latency")
+        }
+    
+    def retry_after(self) -> int:
+        # Roughly the time for the current backlog to clear
+        return max(1, math.ceil(self.latency_ewma))
+    
+    def check(self):
+        if self.llm_in_flight >= self.max_llm_in_flight:
+            self.shed["concurrency"].inc()
+            raise OverloadedError("Too many requests waiting on the LLM", 429, self.retry_after())
+        
+        # Shedding in proportion to the overshoot, never everything, keeps latency samples
+        # flowing so the EWMA can fall back under the SLO once the upstream recovers
+        overshoot = (self.latency_ewma - self.latency_slo) / self.latency_slo
+        if overshoot > 0 and random.random() < min(self.max_shed_ratio, overshoot):
+            self.shed["latency"].inc()
+            raise OverloadedError("LLM latency is above the SLO", 503, self.retry_after())
+    
+    @contextmanager
+    def llm_slot(self) -> Iterator[None]:
+        """Admit one LLM-bound request or raise OverloadedError; tracks in-flight count and latency"""
+        self.check()
+        self.llm_in_flight += 1
+        self.admitted.inc()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.llm_in_flight -= 1
+            self.latency_ewma += self.smoothing * (time.monotonic() - started - self.latency_ewma)
+    
+    def stats(self) -> dict:
+        return {
+            "max_llm_in_flight": self.max_llm_in_flight,
+            "llm_in_flight": self.llm_in_flight,
+            "latency_slo_seconds": self.latency_slo,
+            "latency_ewma_seconds": self.latency_ewma,
+            "admitted": self.admitted.value,
+            "shed_concurrency": self.shed["concurrency"].value,
+            "shed_latency": self.shed["latency"].value
+        }
@@ -0,0 +1,67 @@
+"""
+Micro-batching: pack several prompts into one JSON-mode Gemini request and demultiplex the answers by id
+"""
+
+import os
+import json
+import logging
+from typing import Optional
+
+from common.gemini_client import GeminiClient
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = int(os.getenv("GEMINI_BATCH_SIZE", "10"))
+
+BATCH_INSTRUCTIONS = (
+    "Answer each item below independently, following that item's own instructions. "
+    'Reply with only a JSON array containing one {"id": string, "response": string} object per item.'
+)
+
+def build_batch_prompt(prompts: list[str]) -> str:
+    items = [{"id": str(i), "prompt": prompt} for i, prompt in enumerate(prompts)]
+    return f"{BATCH_INSTRUCTIONS}\n\nItems:\n{json.dumps(items)}"
+
+def parse_batch_response(text: str) -> dict[str, str]:
+    """Map item id -> answer; malformed output yields an empty map so every item falls back"""
+    try:
+        items = json.loads(text)
+    except ValueError:
+        return {}
+    
+    if not isinstance(items, list):
+        return {}
+    
+    return {
+        str(item["id"]): str(item.get("response", "")).strip()
+        for item in items
+        if isinstance(item, dict) and "id" in item
+    }
+
+def generate_batch(client: GeminiClient, prompts: list[str], max_batch_size: int = DEFAULT_BATCH_SIZE,
+                   max_output_tokens: int = 150) -> list[Optional[str]]:
+    """One packed request per chunk; items the batch missed or failed are retried alone, and None if that fails too"""
+    results: list[Optional[str]] = []
+    
+    for start in range(0, len(prompts), max_batch_size):
+        chunk = prompts[start:start + max_batch_size]
+        answers = {}
+        if len(chunk) > 1:
+            try:
+                text = client.generate(build_batch_prompt(chunk), max_output_tokens=max_output_tokens * len(chunk),
+                                       json_output=True)
+                answers = parse_batch_response(text)
+            except Exception as e:
+                # Only this chunk falls back to one call per item; earlier chunks keep their answers
+                logger.warning(f"⚠️  Batch of {len(chunk)} prompts failed, asking one at a time: {e}")
+        
+        for i, prompt in enumerate(chunk):
+            answer = answers.get(str(i))
+            if not answer:
+                try:
+                    answer = client.generate(prompt, max_output_tokens=max_output_tokens)
+                except Exception:
+                    answer = None
+            results.append(answer)
+    
+    return results
@@ -0,0 +1,160 @@
+"""
+Circuit breaker around the Gemini endpoint: fail fast during upstream incidents, probe recovery with a trickle
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from common.retry import is_retryable
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+DEFAULT_SLOW_CALL_SECONDS = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "10"))
+DEFAULT_SLOW_CALL_RATE = float(os.getenv("BREAKER_SLOW_CALL_RATE", "0.8"))
+DEFAULT_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "15"))
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+class CircuitBreaker:
+    def __init__(self, failure_rate: float = DEFAULT_FAILURE_RATE, slow_call_seconds: float = DEFAULT_SLOW_CALL_SECONDS,
+                 slow_call_rate: float = DEFAULT_SLOW_CALL_RATE, open_seconds: float = DEFAULT_OPEN_SECONDS,
+                 window_size: int = 50, min_calls: int = 10, half_open_calls: int = 3):
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.min_calls = min_calls
+        self.half_open_calls = half_open_calls
+        
+        self.state = CLOSED
+        self._window: deque[tuple[bool, bool]] = deque(maxlen=window_size)  # (failed, slow) per call
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+        
+        self.times_opened = 0
+        self.rejected = 0
+    
+    def before_call(self):
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self.rejected += 1
+                    raise CircuitOpenError("Gemini circuit is open")
+                self._transition(HALF_OPEN)
+            
+            if self.state == HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_calls:
+                    self.rejected += 1
+                    raise CircuitOpenError("Gemini circuit is half-open, probe limit reached")
+                self._probes_in_flight += 1
+    
+    def rejecting(self) -> bool:
+        """Whether before_call() would reject right now, without taking a half-open probe slot. Lets a caller
+        fall back before it queues for admission; a True answer counts as a rejection"""
+        with self._lock:
+            if self.state == OPEN:
+                rejecting = time.monotonic() - self._opened_at < self.open_seconds
+            else:
+                rejecting = self.state == HALF_OPEN and self._probes_in_flight >= self.half_open_calls
+            if rejecting:
+                self.rejected += 1
+            return rejecting
+    
+    def record(self, failed: bool, duration: float):
+        slow = duration >= self.slow_call_seconds
+        
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+                if failed or slow:
+                    self._transition(OPEN)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        self._transition(CLOSED)
+                return
+            
+            self._window.append((failed, slow))
+            if self.state == CLOSED and len(self._window) >= self.min_calls:
+                failure_rate, slow_rate = self._rates()
+                if failure_rate >= self.failure_rate or slow_rate >= self.slow_call_rate:
+                    self._transition(OPEN)
+    
+    def release(self):
+        """Hand back a before_call() admission that never reached Gemini"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+    
+    @contextmanager
+    def guard(self, admitted: bool = False) -> Iterator[None]:
+        """Reject immediately while open, otherwise time the call and record its outcome;
+        admitted=True skips the check for a caller that already ran before_call()"""
+        if not admitted:
+            self.before_call()
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            # Only upstream trouble counts; a 400 or a malformed body says nothing about Gemini's health
+            self.record(is_retryable(e), time.monotonic() - started)
+            raise
+        except BaseException:
+            self.release()
+            raise
+        else:
+            self.record(False, time.monotonic() - started)
+    
+    def _rates(self) -> tuple[float, float]:
+        calls = max(len(self._window), 1)
+        failures = sum(1 for failed, _ in self._window if failed)
+        slow = sum(1 for _, is_slow in self._window if is_slow)
+        return failures / calls, slow / calls
+    
+    def _transition(self, state: str):
+        logger.warning(f"Gemini circuit breaker: {self.state} -> {state}")
+        self.state = state
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self.times_opened += 1
+        elif state == CLOSED:
+            self._window.clear()
+    
+    def stats(self) -> dict:
+        with self._lock:
+            failure_rate, slow_rate = self._rates()
+            return {
+                "state": self.state,
+                "failure_rate": failure_rate,
+                "slow_call_rate": slow_rate,
+                "window_calls": len(self._window),
+                "times_opened": self.times_opened,
+                "rejected": self.rejected
+            }
+
+_default_breaker: Optional[CircuitBreaker] = None
+_default_lock = threading.Lock()
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """Process-wide breaker shared by every Gemini client"""
+    global _default_breaker
+    with _default_lock:
+        if _default_breaker is None:
+            _default_breaker = CircuitBreaker()
+        return _default_breaker
@@ -0,0 +1,56 @@
+"""
+Dependency-free text embeddings built from hashed word and character n-grams
+"""
+
+import re
+import zlib
+import numpy as np
+
+DEFAULT_DIM = 1024
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+class HashingEmbedder:
+    # Bump whenever features() or embed() change: vectors persisted to disk are keyed by it
+    VERSION = 1
+    
+    def __init__(self, dim: int = DEFAULT_DIM, char_ngram: int = 3, bigram_weight: float = 0.0):
+        self.dim = dim
+        self.char_ngram = char_ngram
+        self.bigram_weight = bigram_weight  # 0 leaves word order out entirely
+    
+    def fingerprint(self) -> str:
+        """Everything that decides the vector of a text, for naming files of precomputed vectors"""
+        return f"e{self.VERSION}-d{self.dim}-c{self.char_ngram}-b{self.bigram_weight:g}"
+    
+    def features(self, text: str) -> list[str]:
+        words = _WORD_RE.findall(text.lower())
+        features = [f"w:{word}" for word in words]
+        if self.bigram_weight:
+            # Unigrams and trigrams are a bag of words: "from express to standard" equals its reverse
+            features.extend(f"b:{first} {second}" for first, second in zip(words, words[1:]))
+        
+        n = self.char_ngram
+        for word in words:
+            padded = f" {word} "
+            features.extend(f"c:{padded[i:i + n]}" for i in range(max(len(padded) - n + 1, 1)))
+        
+        return features
+    
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        
+        for feature in self.features(text):
+            # crc32 is stable across processes, unlike hash(), so vectors can be persisted
+            h = zlib.crc32(feature.encode("utf-8"))
+            weight = self.bigram_weight if feature.startswith("b:") else 1.0
+            vector[h % self.dim] += weight if h & 0x80000000 else -weight
+        
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def embed_batch(self, texts: list[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            matrix[i] = self.embed(text)
+        return matrix
@@ -0,0 +1,292 @@
+"""
+FAQ retrieval over a loadable corpus: a BM25 inverted index plus a dense NumPy embedding index
+"""
+
+import os
+import re
+import csv
+import json
+import math
+import heapq
+import statistics
+from collections import Counter, defaultdict
+import numpy as np
+from typing import NamedTuple, Optional
+
+from common.embeddings import HashingEmbedder
+
+DEFAULT_MIN_CONFIDENCE = float(os.getenv("FAQ_MIN_CONFIDENCE", "0.5"))
+DEFAULT_MIN_SIMILARITY = float(os.getenv("FAQ_MIN_SIMILARITY", "0.6"))
+DEFAULT_TYPO_SIMILARITY = float(os.getenv("FAQ_TYPO_SIMILARITY", "0.45"))
+
+STOPWORDS = {
+    "a", "an", "and", "are", "am", "as", "at", "be", "but", "by", "can", "could", "do", "does", "for", "from",
+    "get", "got", "have", "has", "hi", "hello", "how", "i", "i'm", "if", "in", "into", "is", "it", "its", "me",
+    "my", "need", "not", "of", "on", "or", "our", "please", "so", "that", "the", "their", "there", "this",
+    "to", "up", "was", "we", "what", "when", "where", "which", "who", "why", "will", "with", "would", "you",
+    "your", "help", "want", "still", "just"
+}
+
+NEGATIONS = {"not", "no", "never"}
+
+# Bump whenever tokenize() or stem() change: the FAQ vectors cached on disk were embedded from their output
+TOKENIZER_VERSION = 1
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+# "log in" and "log out" are opposite requests, but "in" is a stopword and would leave both as just "log"
+_PHRASAL_RE = re.compile(r"\b(log|sign)\s+(in|out|up|on|off)\b")
+
+def stem(word: str) -> str:
+    """Light suffix stripping so 'passwords', 'charged' and 'shipping' meet their base forms"""
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            if len(word) > 3 and word[-1] == word[-2] and word[-1] not in "ls":
+                word = word[:-1]
+            break
+    else:
+        if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+            word = word[:-1]
+    
+    if word.endswith("e") and len(word) > 3:
+        word = word[:-1]
+    return word
+
+def tokenize(text: str, keep_negation: bool = False) -> list[str]:
+    """Stemmed content terms; keep_negation adds a "not" term for not/no/never/n't instead of dropping it"""
+    tokens = []
+    for token in _TOKEN_RE.findall(_PHRASAL_RE.sub(r"\1\2", text.lower())):
+        if keep_negation and (token in NEGATIONS or token.endswith("n't")):
+            tokens.append("not")
+            if token in NEGATIONS:
+                continue
+        if token.endswith("n't"):
+            token = {"can't": "can", "won't": "will"}.get(token, token[:-3])
+        elif token.endswith("'s"):
+            token = token[:-2]
+        if token and token not in STOPWORDS:
+            tokens.append(stem(token))
+    return tokens
+
+class FAQEntry(NamedTuple):
+    question: str
+    answer: str
+
+class FAQMatch(NamedTuple):
+    answer: str
+    question: str
+    score: float
+    confidence: float
+
+class FAQIndex:
+    def __init__(self, entries: list[FAQEntry], k1: float = 1.5, b: float = 0.75,
+                 min_confidence: float = DEFAULT_MIN_CONFIDENCE):
+        self.entries = entries
+        self.k1 = k1
+        self.b = b
+        self.min_confidence = min_confidence
+        
+        documents = [Counter(tokenize(entry.question)) for entry in entries]
+        n = max(len(entries), 1)
+        avg_length = sum(sum(terms.values()) for terms in documents) / n or 1.0
+        
+        # term -> [(doc_id, BM25 term weight)]; the length normalisation is folded in here
+        # so a query only multiplies precomputed weights by IDF
+        self.postings: dict[str, list[tuple[int, float]]] = defaultdict(list)
+        for doc_id, terms in enumerate(documents):
+            norm = k1 * (1 - b + b * sum(terms.values()) / avg_length)
+            for term, tf in terms.items():
+                self.postings[term].append((doc_id, tf * (k1 + 1) / (tf + norm)))
+        
+        self.idf = {
+            term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+        # What a term no question contains counts for: a typical FAQ term. Weighing it as the rarest term possible
+        # let one ordinary extra word ("change", "asap") sink a plain question below the threshold
+        self.unseen_idf = statistics.median(self.idf.values()) if self.idf else 1.0
+    
+    @classmethod
+    def from_dict(cls, mapping: dict[str, str], **kwargs) -> "FAQIndex":
+        return cls([FAQEntry(question, answer) for question, answer in mapping.items()], **kwargs)
+    
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "FAQIndex":
+        return cls(load_faq_entries(path), **kwargs)
+    
+    def search(self, query: str, top_k: int = 3) -> list[FAQMatch]:
+        """Best distinct answers by BM25 score"""
+        # Confidence is the share of the query's IDF weight the question covers. Terms outside the
+        # FAQ vocabulary count at unseen_idf, so "delete my account" is not a full match for "account"
+        query_terms = set(tokenize(query))
+        terms = [term for term in query_terms if term in self.idf]
+        if not terms:
+            return []
+        
+        scores: dict[int, float] = defaultdict(float)
+        covered: dict[int, float] = defaultdict(float)
+        for term in terms:
+            idf = self.idf[term]
+            for doc_id, weight in self.postings[term]:
+                scores[doc_id] += idf * weight
+                covered[doc_id] += idf
+        
+        query_weight = sum(self.idf.get(term, self.unseen_idf) for term in query_terms)
+        matches, seen_answers = [], set()
+        # Extra candidates because several questions can share one answer
+        for doc_id in heapq.nlargest(top_k * 4, scores, key=scores.get):
+            entry = self.entries[doc_id]
+            if entry.answer in seen_answers:
+                continue
+            seen_answers.add(entry.answer)
+            matches.append(FAQMatch(entry.answer, entry.question, scores[doc_id], covered[doc_id] / query_weight))
+            if len(matches) == top_k:
+                break
+        
+        return matches
+    
+    def lookup(self, query: str) -> Optional[FAQMatch]:
+        """Best match above the confidence threshold, or None"""
+        matches = self.search(query, top_k=1)
+        if matches and matches[0].confidence >= self.min_confidence:
+            return matches[0]
+        return None
+    
+    def lookup_batch(self, queries: list[str]) -> list[Optional[FAQMatch]]:
+        return [self.lookup(query) for query in queries]
+
+class VectorFAQIndex:
+    """Dense retrieval: FAQ questions embedded once into a contiguous float32 matrix, queries answered by one matmul"""
+    
+    def __init__(self, entries: list[FAQEntry], embedder: Optional[HashingEmbedder] = None,
+                 min_similarity: float = DEFAULT_MIN_SIMILARITY, matrix: Optional[np.ndarray] = None):
+        self.entries = entries
+        self.embedder = embedder or HashingEmbedder()
+        self.min_similarity = min_similarity
+        self.matrix = matrix if matrix is not None else self.embed([entry.question for entry in entries])
+    
+    def embed(self, texts: list[str]) -> np.ndarray:
+        # Stopwords dominate short questions, so embed the same stemmed content terms BM25 sees
+        return self.embedder.embed_batch([" ".join(tokenize(text)) for text in texts])
+    
+    @classmethod
+    def from_file(cls, path: str, embedder: Optional[HashingEmbedder] = None, **kwargs) -> "VectorFAQIndex":
+        """Load a corpus, reusing `<path>.<version>.vectors.npy` via mmap when it is still fresh, otherwise rebuilding it"""
+        entries = load_faq_entries(path)
+        embedder = embedder or HashingEmbedder()
+        # A tokenizer or embedder change gets a new file instead of silently reusing vectors built the old way
+        cache_path = f"{path}.t{TOKENIZER_VERSION}-{embedder.fingerprint()}.vectors.npy"
+        
+        if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            try:
+                matrix = np.load(cache_path, mmap_mode="r")
+            except (OSError, ValueError):
+                matrix = None  # unreadable; rebuilt and replaced below
+            if matrix is not None and matrix.shape == (len(entries), embedder.dim):
+                return cls(entries, embedder, matrix=matrix, **kwargs)
+        
+        index = cls(entries, embedder, **kwargs)
+        # Written aside and renamed into place: workers starting together must never mmap a half-written file
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp.npy"
+        try:
+            np.save(tmp_path, index.matrix)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass  # read-only deployments just keep the in-memory matrix
+        return index
+    
+    def search_batch(self, queries: list[str], top_k: int = 1) -> list[list[FAQMatch]]:
+        if not queries or not self.entries:
+            return [[] for _ in queries]
+        
+        scores = self.embed(queries) @ self.matrix.T
+        k = min(top_k, len(self.entries))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        
+        results = []
+        for row, candidates in zip(scores, top):
+            ranked = candidates[np.argsort(-row[candidates])]
+            results.append([
+                FAQMatch(self.entries[i].answer, self.entries[i].question, float(row[i]), float(row[i]))
+                for i in ranked
+            ])
+        return results
+    
+    def search(self, query: str, top_k: int = 1) -> list[FAQMatch]:
+        return self.search_batch([query], top_k)[0]
+    
+    def lookup_batch(self, queries: list[str]) -> list[Optional[FAQMatch]]:
+        return [
+            matches[0] if matches and matches[0].confidence >= self.min_similarity else None
+            for matches in self.search_batch(queries)
+        ]
+    
+    def lookup(self, query: str) -> Optional[FAQMatch]:
+        return self.lookup_batch([query])[0]
+
+class HybridFAQIndex:
+    """BM25 first, then the dense index for paraphrases and typos BM25 cannot match"""
+    
+    def __init__(self, sparse: FAQIndex, dense: VectorFAQIndex, typo_similarity: float = DEFAULT_TYPO_SIMILARITY):
+        self.sparse = sparse
+        self.dense = dense
+        self.typo_similarity = typo_similarity
+        self._vocabulary = dense.embedder.embed_batch(sorted(sparse.idf))
+    
+    def _unknown_terms(self, query: str) -> tuple[list[str], bool]:
+        """Content terms outside the FAQ vocabulary, and whether the dense index may answer the query at all:
+        it has to share a term with the FAQ, or every term has to be close to one, like "pasword". Character
+        n-grams alone rate "newsletter" or "2fa" close enough to something to pass the similarity threshold"""
+        terms = set(tokenize(query))
+        unknown = [term for term in terms if term not in self.sparse.idf]
+        if len(unknown) < len(terms):
+            return unknown, True
+        if not unknown or not len(self._vocabulary):
+            return unknown, False
+        similarity = self.dense.embedder.embed_batch(unknown) @ self._vocabulary.T
+        return unknown, bool((similarity.max(axis=1) >= self.typo_similarity).all())
+    
+    @classmethod
+    def from_file(cls, path: str) -> "HybridFAQIndex":
+        return cls(FAQIndex.from_file(path), VectorFAQIndex.from_file(path))
+    
+    @classmethod
+    def from_dict(cls, mapping: dict[str, str]) -> "HybridFAQIndex":
+        entries = [FAQEntry(question, answer) for question, answer in mapping.items()]
+        return cls(FAQIndex(entries), VectorFAQIndex(entries))
+    
+    def lookup(self, query: str) -> Optional[FAQMatch]:
+        return self.lookup_batch([query])[0]
+    
+    def lookup_batch(self, queries: list[str]) -> list[Optional[FAQMatch]]:
+        matches = self.sparse.lookup_batch(queries)
+        # BM25 only vouches for queries made of FAQ terms. With a new word in the query, one shared keyword decides
+        # "return my shoes" and "cancel my subscription" alike, so the dense index judges how much of it matches
+        deferred = []
+        for i, query in enumerate(queries):
+            unknown, grounded = self._unknown_terms(query)
+            if grounded and (unknown or matches[i] is None):
+                deferred.append(i)
+        
+        for i, match in zip(deferred, self.dense.lookup_batch([queries[i] for i in deferred])):
+            matches[i] = match
+        return matches
+
+def load_faq_entries(path: str) -> list[FAQEntry]:
+    """Read a .json list of {"question" | "questions", "answer"} objects or a .csv with question,answer columns"""
+    entries = []
+    
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                entries.append(FAQEntry(row["question"], row["answer"]))
+    else:
+        with open(path, encoding="utf-8") as f:
+            for item in json.load(f):
+                for question in item.get("questions") or [item["question"]]:
+                    entries.append(FAQEntry(question, item["answer"]))
+    
+    return entries
@@ -0,0 +1,33 @@
+"""
+Fast JSON encoding for small API payloads: orjson when installed, the standard library otherwise
+"""
+
+import json
+from datetime import datetime
+from typing import Any
+
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(obj: Any) -> Any:
+    # A model's __dict__ holds exactly its field values, so this skips model_dump's copy and validation
+    if isinstance(obj, BaseModel):
+        return obj.__dict__
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump_json().encode("utf-8")
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def loads(data: str | bytes) -> Any:
+    # orjson.JSONDecodeError subclasses ValueError, like json's
+    return orjson.loads(data) if orjson is not None else json.loads(data)
@@ -0,0 +1,242 @@
+"""
+Shared Google Gemini client with keep-alive connection pooling
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+import httpx
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Iterable, Iterator, Optional
+
+from common.rate_limit import RateLimiter, estimate_tokens, get_rate_limiter
+from common.retry import RetryPolicy
+from common.circuit_breaker import CircuitBreaker, get_circuit_breaker
+from common.metrics import get_registry
+
+GEMINI_MODEL = "gemini-2.0-flash"
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/models"
+
+DEFAULT_POOL_SIZE = int(os.getenv("GEMINI_POOL_SIZE", "20"))
+DEFAULT_ASYNC_POOL_SIZE = int(os.getenv("GEMINI_ASYNC_POOL_SIZE", "200"))
+DEFAULT_HTTP2 = os.getenv("GEMINI_HTTP2", "true").lower() in ("1", "true", "yes")
+DEFAULT_TIMEOUT = 30.0
+PARTIAL_MARKER = " [response cut off]"
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_LATENCY = get_registry().histogram("gemini_upstream_seconds", "Wall time of each Gemini HTTP call, after admission")
+
+class GeminiClient:
+    def __init__(self, api_key: str, model: str = GEMINI_MODEL, pool_size: int = DEFAULT_POOL_SIZE,
+                 http2: bool = DEFAULT_HTTP2, timeout: float = DEFAULT_TIMEOUT,
+                 async_pool_size: int = DEFAULT_ASYNC_POOL_SIZE, limiter: Optional[RateLimiter] = None,
+                 retry: Optional[RetryPolicy] = None, breaker: Optional[CircuitBreaker] = None):
+        self.api_key = api_key
+        self.model = model
+        self.url = f"{GEMINI_BASE_URL}/{model}:generateContent"
+        self.stream_url = f"{GEMINI_BASE_URL}/{model}:streamGenerateContent"
+        self.http2 = http2
+        self.timeout = timeout
+        self.async_pool_size = async_pool_size
+        self.limiter = limiter or get_rate_limiter()
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or get_circuit_breaker()
+        
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self.headers = {"Content-Type": "application/json", "x-goog-api-key": api_key or ""}
+        self._http = httpx.Client(http2=http2, limits=limits, headers=self.headers, timeout=timeout)
+        self._async_http: httpx.AsyncClient | None = None
+    
+    def build_payload(self, prompt: str, temperature: float = 0.7, max_output_tokens: int = 150,
+                      json_output: bool = False) -> dict:
+        payload = {
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": {"temperature": temperature, "maxOutputTokens": max_output_tokens}
+        }
+        if json_output:
+            payload["generationConfig"]["responseMimeType"] = "application/json"
+        return payload
+    
+    @contextmanager
+    def _admit(self, tokens: int, timeout: Optional[float] = None) -> Iterator[None]:
+        # Breaker before limiter: an open circuit rejects without booking RPM/TPM or queueing,
+        # and only the upstream call itself is timed as slow or not
+        self.breaker.before_call()
+        admitted = False
+        try:
+            with self.limiter.limit(tokens, timeout):
+                admitted = True
+                with self.breaker.guard(admitted=True), UPSTREAM_LATENCY.time():
+                    yield
+        finally:
+            if not admitted:
+                self.breaker.release()
+    
+    @asynccontextmanager
+    async def _aadmit(self, tokens: int, timeout: Optional[float] = None) -> AsyncIterator[None]:
+        self.breaker.before_call()
+        admitted = False
+        try:
+            async with self.limiter.alimit(tokens, timeout):
+                admitted = True
+                with self.breaker.guard(admitted=True), UPSTREAM_LATENCY.time():
+                    yield
+        finally:
+            if not admitted:
+                self.breaker.release()
+    
+    def generate(self, prompt: str, temperature: float = 0.7, max_output_tokens: int = 150,
+                 timeout: float | None = None, json_output: bool = False) -> str:
+        """Blocking generate; transient failures are retried until `timeout` (the overall deadline) runs out"""
+        payload = self.build_payload(prompt, temperature, max_output_tokens, json_output)
+        tokens = estimate_tokens(prompt, max_output_tokens)
+        
+        def attempt(remaining: float) -> str:
+            # The deadline covers the rate-limit wait too, not just the HTTP call
+            deadline_at = time.monotonic() + remaining
+            with self._admit(tokens, remaining):
+                response = self._http.post(self.url, json=payload, timeout=max(deadline_at - time.monotonic(), 0.001))
+                response.raise_for_status()
+            return extract_text(response.json())
+        
+        return self.retry.call(attempt, deadline=timeout)
+    
+    async def agenerate(self, prompt: str, temperature: float = 0.7, max_output_tokens: int = 150,
+                        timeout: float | None = None, json_output: bool = False) -> str:
+        """Non-blocking generate; cancelling the awaiting task aborts the upstream request"""
+        payload = self.build_payload(prompt, temperature, max_output_tokens, json_output)
+        tokens = estimate_tokens(prompt, max_output_tokens)
+        
+        async def attempt(remaining: float) -> str:
+            deadline_at = time.monotonic() + remaining
+            async with self._aadmit(tokens, remaining):
+                response = await asyncio.wait_for(self._get_async_http().post(self.url, json=payload),
+                                                  deadline_at - time.monotonic())
+                response.raise_for_status()
+            return extract_text(response.json())
+        
+        return await self.retry.acall(attempt, deadline=timeout)
+    
+    def stream(self, prompt: str, temperature: float = 0.7, max_output_tokens: int = 150) -> Iterator[str]:
+        """Yield text chunks as Gemini produces them"""
+        payload = self.build_payload(prompt, temperature, max_output_tokens)
+        
+        with self._admit(estimate_tokens(prompt, max_output_tokens)):
+            with self._http.stream("POST", self.stream_url, params={"alt": "sse"}, json=payload) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    text = parse_sse_line(line)
+                    if text:
+                        yield text
+    
+    async def astream(self, prompt: str, temperature: float = 0.7, max_output_tokens: int = 150) -> AsyncIterator[str]:
+        payload = self.build_payload(prompt, temperature, max_output_tokens)
+        
+        async with self._aadmit(estimate_tokens(prompt, max_output_tokens)):
+            async with self._get_async_http().stream("POST", self.stream_url, params={"alt": "sse"}, json=payload) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    text = parse_sse_line(line)
+                    if text:
+                        yield text
+    
+    async def aprobe(self, timeout: float = 5.0) -> bool:
+        """Cheap reachability check: fetches model metadata (no tokens, no quota) and leaves a pooled connection open"""
+        try:
+            response = await self._get_async_http().get(f"{GEMINI_BASE_URL}/{self.model}", timeout=timeout)
+            return response.status_code == 200
+        except httpx.HTTPError:
+            return False
+    
+    def _get_async_http(self) -> httpx.AsyncClient:
+        # Created lazily so the pool binds to the running event loop, not import time
+        if self._async_http is None or self._async_http.is_closed:
+            limits = httpx.Limits(max_connections=self.async_pool_size,
+                                  max_keepalive_connections=self.async_pool_size)
+            self._async_http = httpx.AsyncClient(http2=self.http2, limits=limits,
+                                                 headers=self.headers, timeout=self.timeout)
+        return self._async_http
+    
+    def close(self):
+        self._http.close()
+    
+    async def aclose(self):
+        if self._async_http is not None:
+            await self._async_http.aclose()
+            self._async_http = None
+
+def extract_text(result: dict) -> str:
+    parts = result["candidates"][0].get("content", {}).get("parts", [])
+    if parts:
+        return parts[0].get("text", "").strip()
+    
+    raise RuntimeError("Invalid response")
+
+def parse_sse_line(line: str) -> str:
+    """Text carried by one `data:` line of a streamGenerateContent?alt=sse response"""
+    if not line.startswith("data:"):
+        return ""
+    
+    candidates = json.loads(line[5:]).get("candidates") or [{}]
+    parts = candidates[0].get("content", {}).get("parts", [])
+    return "".join(part.get("text", "") for part in parts)
+
+class FallbackStream:
+    """
+    Relay a Gemini stream, standing in with the fallback when it fails or stays empty before any text was sent.
+    A stream that breaks off midway ends with PARTIAL_MARKER and sets `partial`; once exhausted, `text` is the
+    reply without the marker.
+    """
+    
+    def __init__(self, chunks: Iterable[str], fallback: Callable[[], str]):
+        self.chunks = chunks
+        self.fallback = fallback
+        self.text = ""
+        self.partial = False
+        self.fell_back = False
+    
+    def __iter__(self) -> Iterator[str]:
+        sent = []
+        try:
+            for chunk in self.chunks:
+                sent.append(chunk)
+                yield chunk
+            if not "".join(sent).strip():
+                raise RuntimeError("Invalid response")
+        except Exception as e:
+            logger.warning(f"⚠️  LLM stream failed: {e}")
+            if sent:
+                # The reader already has the beginning; a fallback appended to it would read as one garbled answer
+                self.partial = True
+                self.text = "".join(sent)
+                yield PARTIAL_MARKER
+                return
+            self.fell_back = True
+            self.text = self.fallback()
+            yield self.text
+            return
+        
+        self.text = "".join(sent).strip()
+
+_clients: dict[tuple, GeminiClient] = {}
+_clients_lock = threading.Lock()
+
+def get_client(api_key: str, model: str = GEMINI_MODEL) -> GeminiClient:
+    """Return the process-wide client for this key/model so every agent shares one pool"""
+    key = (api_key, model)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = GeminiClient(api_key, model)
+            _clients[key] = client
+        return client
+
+async def aclose_clients():
+    with _clients_lock:
+        clients = list(_clients.values())
+    for client in clients:
+        await client.aclose()
@@ -0,0 +1,64 @@
+"""
+Cached dependency probes for readiness: refreshed on a background timer, never once per health request
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROBE_INTERVAL_SECONDS = float(os.getenv("HEALTH_PROBE_INTERVAL_SECONDS", "30"))
+DEFAULT_PROBE_TIMEOUT_SECONDS = float(os.getenv("HEALTH_PROBE_TIMEOUT_SECONDS", "5"))
+
+class CachedProbe:
+    def __init__(self, name: str, check: Callable[[], Awaitable[bool]],
+                 interval: float = DEFAULT_PROBE_INTERVAL_SECONDS, timeout: float = DEFAULT_PROBE_TIMEOUT_SECONDS):
+        self.name = name
+        self.check = check
+        self.interval = interval
+        self.timeout = timeout
+        
+        self.ok: Optional[bool] = None  # unknown until the first probe
+        self.checked_at: Optional[float] = None
+        self.consecutive_failures = 0
+        self._task: Optional[asyncio.Task] = None
+    
+    async def refresh(self) -> bool:
+        try:
+            ok = bool(await asyncio.wait_for(self.check(), self.timeout))
+        except Exception as e:
+            logger.warning(f"{self.name} probe failed: {e!r}")
+            ok = False
+        
+        if ok != self.ok and self.ok is not None:
+            logger.warning(f"{self.name} probe: {'up' if ok else 'down'}")
+        self.ok = ok
+        self.checked_at = time.time()
+        self.consecutive_failures = 0 if ok else self.consecutive_failures + 1
+        return ok
+    
+    def start(self):
+        """Re-probe every `interval` seconds; call refresh() first if a result is needed right away"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.refresh()
+    
+    def stats(self) -> dict:
+        return {
+            "ok": self.ok,
+            "age_seconds": round(time.time() - self.checked_at, 1) if self.checked_at else None,
+            "consecutive_failures": self.consecutive_failures,
+            "interval_seconds": self.interval
+        }
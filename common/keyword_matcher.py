@@ -0,0 +1,108 @@
+"""
+Compiled multi-pattern keyword matcher (Aho-Corasick) for FAQ, escalation and category tables
+"""
+
+from collections import deque
+from typing import Any, Iterable, NamedTuple, Optional
+
+class KeywordMatch(NamedTuple):
+    priority: int
+    keyword: str
+    value: Any
+    table: str
+
+class KeywordHits:
+    """Every table hit found by one scan, queryable per table"""
+    
+    def __init__(self, matches: list[KeywordMatch]):
+        self.matches = matches
+    
+    def best(self, table: str) -> Optional[Any]:
+        """Value of the highest-priority (lowest number) hit, mirroring an if/elif chain over the table"""
+        hits = [match for match in self.matches if match.table == table]
+        return min(hits, key=lambda match: match.priority).value if hits else None
+    
+    def all(self, table: str) -> list:
+        """Distinct hit values in priority order"""
+        values = []
+        for match in sorted((match for match in self.matches if match.table == table), key=lambda match: match.priority):
+            if match.value not in values:
+                values.append(match.value)
+        return values
+    
+    def any(self, table: str) -> bool:
+        return any(match.table == table for match in self.matches)
+
+class KeywordMatcher:
+    def __init__(self):
+        self._entries: list[KeywordMatch] = []
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[int]] = [[]]
+        self._built = False
+    
+    def add(self, keyword: str, value: Any, table: str = "default", priority: int = 0) -> "KeywordMatcher":
+        self._entries.append(KeywordMatch(priority, keyword.lower(), value, table))
+        self._built = False
+        return self
+    
+    def add_table(self, table: str, mapping: dict) -> "KeywordMatcher":
+        """keyword -> value; earlier keywords win, like iterating the dict and breaking on the first hit"""
+        for priority, (keyword, value) in enumerate(mapping.items()):
+            self.add(keyword, value, table, priority)
+        return self
+    
+    def add_groups(self, table: str, groups: Iterable[tuple[Any, Iterable[str]]]) -> "KeywordMatcher":
+        """(value, keywords) pairs; earlier groups win, like an if/elif chain of any(word in text ...)"""
+        for priority, (value, keywords) in enumerate(groups):
+            for keyword in keywords:
+                self.add(keyword, value, table, priority)
+        return self
+    
+    def build(self):
+        self._goto, self._fail, self._out = [{}], [0], [[]]
+        
+        for index, entry in enumerate(self._entries):
+            state = 0
+            for ch in entry.keyword:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = next_state
+            self._out[state].append(index)
+        
+        # Breadth-first: each state's failure link points at the longest proper suffix that is also a prefix
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(ch, 0)
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+        
+        self._built = True
+    
+    def scan(self, text: str) -> KeywordHits:
+        """Find every keyword occurrence (substring semantics, case-insensitive) in one pass over the text"""
+        if not self._built:
+            self.build()
+        
+        goto, fail, out = self._goto, self._fail, self._out
+        seen: set[int] = set()
+        state = 0
+        
+        for ch in text.lower():
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                seen.update(out[state])
+        
+        return KeywordHits([self._entries[index] for index in sorted(seen)])
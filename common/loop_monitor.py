@@ -0,0 +1,114 @@
+"""
+Event-loop lag sampling and blocking-call detection: how late a timer fires is how long ready
+callbacks waited behind blocking work, and a watchdog thread captures what the loop was stuck in
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+from typing import Optional
+
+from common.metrics import get_registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_INTERVAL_SECONDS", "0.25"))
+DEFAULT_SLOW_CALLBACK_SECONDS = float(os.getenv("LOOP_SLOW_CALLBACK_SECONDS", "0.1"))
+DEFAULT_MAX_STALLS = 20
+STACK_LIMIT = 15
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = DEFAULT_INTERVAL_SECONDS,
+                 slow_callback_seconds: float = DEFAULT_SLOW_CALLBACK_SECONDS, max_stalls: int = DEFAULT_MAX_STALLS):
+        self.interval = interval
+        self.slow_callback_seconds = slow_callback_seconds
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.samples = 0
+        self.stalls: deque[dict] = deque(maxlen=max_stalls)  # most recent last
+        self._due: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._open_stall: Optional[dict] = None
+        
+        registry = get_registry()
+        self.lag_histogram = registry.histogram("event_loop_lag_seconds", "How late the event loop ran a due timer")
+        self.stall_count = registry.counter("event_loop_stalls_total",
+                                            "Times a callback blocked the event loop past the slow-callback threshold")
+    
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        if self.slow_callback_seconds > 0 and (self._watchdog is None or not self._watchdog.is_alive()):
+            self._loop_thread_id = threading.get_ident()
+            self._stopped.clear()
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+    
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._stopped.set()
+    
+    async def _run(self):
+        while True:
+            # Monotonic rather than loop.time(), so the watchdog thread reads the same clock
+            self._due = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self._record(max(0.0, time.monotonic() - self._due))
+    
+    def _record(self, lag: float):
+        self.lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        self.samples += 1
+        self.lag_histogram.observe(lag)
+        
+        stall = self._open_stall
+        if stall is not None:
+            stall["lag_ms"] = round(lag * 1000, 1)  # the full stall, now that the loop is back
+            self._open_stall = None
+    
+    def _watch(self):
+        # The loop can't report on itself while blocked, so a thread checks the sampler's deadline
+        # and grabs the loop thread's stack while the blocking call is still on it
+        while not self._stopped.wait(self.slow_callback_seconds / 2):
+            due = self._due
+            if due is None or self._open_stall is not None:
+                continue
+            blocked = time.monotonic() - due
+            if blocked < self.slow_callback_seconds:
+                continue
+            
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame, limit=STACK_LIMIT)) if frame else ""
+            stall = {"detected_at": time.time(), "lag_ms": round(blocked * 1000, 1), "stack": stack}
+            self._open_stall = stall
+            self.stalls.append(stall)
+            self.stall_count.inc()
+            logger.warning(f"🐢 Event loop blocked for {blocked * 1000:.0f}ms+, loop thread is in:\n{stack}")
+    
+    def current_lag(self) -> float:
+        """Latest sample, or how overdue the pending one already is; a stall still in progress counts too"""
+        if self._due is None:
+            return self.lag
+        return max(self.lag, time.monotonic() - self._due)
+    
+    def stats(self) -> dict:
+        return {
+            "interval_ms": self.interval * 1000,
+            "lag_ms": round(self.lag * 1000, 2),
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "samples": self.samples,
+            "lag": self.lag_histogram.summary(),
+            "slow_callback_ms": self.slow_callback_seconds * 1000,
+            "stalls": self.stall_count.value,
+            "recent_stalls": list(self.stalls)
+        }
@@ -0,0 +1,270 @@
+"""
+Metrics: counters and fixed-bucket latency histograms, exported as JSON or Prometheus text.
+Values live in process memory, or in per-worker mmap'd files that every worker can aggregate.
+"""
+
+import os
+import glob
+import mmap
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Iterator, Optional, Union
+
+# Seconds; wide enough to separate a FAQ hit (sub-millisecond) from a slow Gemini call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Shared directory for multi-worker deployments (uvicorn --workers N); empty it before starting the server
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "")
+METRICS_MAX_SLOTS = int(os.getenv("METRICS_MAX_SLOTS", "4096"))
+
+def format_labels(labels: dict, extra: Optional[dict] = None) -> str:
+    labels = {**labels, **(extra or {})}
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+class LocalStore:
+    """Metric values in this process only"""
+    
+    def __init__(self):
+        self.values = array("d")
+    
+    def allocate(self, key: str, size: int) -> int:
+        offset = len(self.values)
+        self.values.extend([0.0] * size)
+        return offset
+    
+    def read(self, key: str, offset: int, size: int) -> list[float]:
+        return list(self.values[offset:offset + size])
+    
+    def workers(self) -> int:
+        return 1
+
+class MmapStore:
+    """
+    One mmap'd file of float64 slots per worker process plus a keys file mapping metric keys to slots.
+    Each worker only writes its own file, so increments need no cross-process lock; reads sum every file.
+    """
+    
+    def __init__(self, directory: str, max_slots: int = METRICS_MAX_SLOTS):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_slots = max_slots
+        self.path = os.path.join(directory, f"metrics_{os.getpid()}.bin")
+        
+        with open(self.path, "wb") as f:
+            f.truncate(max_slots * 8)
+        with open(self.path, "r+b") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0)
+        self.values = memoryview(self._mmap).cast("d")
+        self._keys = open(self.path[:-4] + ".keys", "w", encoding="utf-8")
+        self._next = 0
+        
+        # path -> (values, {key: offset}, bytes of the keys file already parsed)
+        self._peers: dict[str, tuple[memoryview, dict[str, int], int]] = {}
+    
+    def allocate(self, key: str, size: int) -> int:
+        if self._next + size > self.max_slots:
+            raise RuntimeError(f"Metrics store is full ({self.max_slots} slots); raise METRICS_MAX_SLOTS")
+        offset = self._next
+        self._next += size
+        self._keys.write(f"{offset}\t{key}\n")
+        self._keys.flush()
+        return offset
+    
+    def _peer(self, path: str) -> tuple[memoryview, dict[str, int]]:
+        values, keys, parsed = self._peers.get(path) or (None, {}, 0)
+        if values is None:
+            with open(path, "rb") as f:
+                values = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)).cast("d")
+        
+        keys_path = path[:-4] + ".keys"
+        if os.path.getsize(keys_path) > parsed:
+            with open(keys_path, encoding="utf-8") as f:
+                f.seek(parsed)
+                chunk = f.read()
+            # Only complete lines; a half-written one is picked up on the next read
+            complete = chunk[:chunk.rfind("\n") + 1]
+            for line in complete.splitlines():
+                offset, key = line.split("\t", 1)
+                keys[key] = int(offset)
+            parsed += len(complete.encode("utf-8"))
+        
+        self._peers[path] = (values, keys, parsed)
+        return values, keys
+    
+    def read(self, key: str, offset: int, size: int) -> list[float]:
+        """Sum of this metric's slots across every worker file in the directory, live or exited"""
+        totals = list(self.values[offset:offset + size])
+        for path in glob.glob(os.path.join(self.directory, "metrics_*.bin")):
+            if path == self.path:
+                continue
+            values, keys = self._peer(path)
+            peer_offset = keys.get(key)
+            if peer_offset is not None:
+                for i in range(size):
+                    totals[i] += values[peer_offset + i]
+        return totals
+    
+    def workers(self) -> int:
+        return len(glob.glob(os.path.join(self.directory, "metrics_*.bin")))
+
+class Counter:
+    def __init__(self, name: str, description: str, labels: Optional[dict] = None,
+                 store: Optional[Union[LocalStore, MmapStore]] = None):
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.key = name + format_labels(self.labels)
+        self._store = store or LocalStore()
+        self._values = self._store.values
+        self._offset = self._store.allocate(self.key, 1)
+    
+    def inc(self, amount: Union[int, float] = 1):
+        # Only this process writes its slots, so a plain add is enough; no lock on the hot path
+        self._values[self._offset] += amount
+    
+    @property
+    def value(self) -> Union[int, float]:
+        value = self._store.read(self.key, self._offset, 1)[0]
+        return int(value) if value.is_integer() else value
+
+class Histogram:
+    def __init__(self, name: str, description: str, labels: Optional[dict] = None,
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS, store: Optional[Union[LocalStore, MmapStore]] = None):
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.key = name + format_labels(self.labels)
+        self.buckets = tuple(buckets)
+        self._store = store or LocalStore()
+        self._values = self._store.values
+        # Slots: one count per bucket (not cumulative, the last one is +Inf), then the sum
+        self._size = len(self.buckets) + 2
+        self._offset = self._store.allocate(self.key, self._size)
+        self._sum_offset = self._offset + len(self.buckets) + 1
+    
+    def observe(self, seconds: float):
+        self._values[self._offset + bisect_left(self.buckets, seconds)] += 1
+        self._values[self._sum_offset] += seconds
+    
+    def _read(self) -> tuple[list[int], float]:
+        values = self._store.read(self.key, self._offset, self._size)
+        return [int(count) for count in values[:-1]], values[-1]
+    
+    @property
+    def counts(self) -> list[int]:
+        return self._read()[0]
+    
+    @property
+    def sum(self) -> float:
+        return self._read()[1]
+    
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+    
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+    
+    def quantile(self, q: float, counts: Optional[list[int]] = None) -> float:
+        """Estimate like PromQL's histogram_quantile: linear interpolation inside the bucket holding the rank"""
+        counts = counts if counts is not None else self.counts
+        total = sum(counts)
+        if not total:
+            return 0.0
+        
+        rank = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            if seen + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+    
+    def summary(self) -> dict:
+        counts, total = self._read()
+        count = sum(counts)
+        return {
+            "count": count,
+            "avg_ms": total / max(count, 1) * 1000,
+            "p50_ms": self.quantile(0.5, counts) * 1000,
+            "p95_ms": self.quantile(0.95, counts) * 1000,
+            "p99_ms": self.quantile(0.99, counts) * 1000
+        }
+
+class MetricsRegistry:
+    def __init__(self, store: Optional[Union[LocalStore, MmapStore]] = None):
+        self.store = store or LocalStore()
+        self._metrics: dict[tuple, Union[Counter, Histogram]] = {}
+        self._lock = threading.Lock()
+    
+    def _get_or_create(self, cls, name: str, description: str, labels: dict, **kwargs):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = cls(name, description, labels, store=self.store, **kwargs)
+                self._metrics[key] = metric
+            return metric
+    
+    def counter(self, name: str, description: str, **labels) -> Counter:
+        return self._get_or_create(Counter, name, description, labels)
+    
+    def histogram(self, name: str, description: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+                  **labels) -> Histogram:
+        return self._get_or_create(Histogram, name, description, labels, buckets=buckets)
+    
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        
+        families: dict[str, list] = {}
+        for metric in metrics:
+            families.setdefault(metric.name, []).append(metric)
+        
+        lines = []
+        for name, family in families.items():
+            kind = "counter" if isinstance(family[0], Counter) else "histogram"
+            lines.append(f"# HELP {name} {family[0].description}")
+            lines.append(f"# TYPE {name} {kind}")
+            
+            for metric in family:
+                if kind == "counter":
+                    lines.append(f"{name}{format_labels(metric.labels)} {metric.value}")
+                    continue
+                
+                counts, total = metric._read()
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{format_labels(metric.labels, {'le': le})} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(metric.labels)} {total}")
+                lines.append(f"{name}_count{format_labels(metric.labels)} {cumulative}")
+        
+        return "\n".join(lines) + "\n"
+
+_default_registry: Optional[MetricsRegistry] = None
+_default_lock = threading.Lock()
+
+def get_registry() -> MetricsRegistry:
+    """Process-wide registry shared by the agents, the Gemini client and the rate limiter"""
+    global _default_registry
+    with _default_lock:
+        if _default_registry is None:
+            store = MmapStore(METRICS_MULTIPROC_DIR) if METRICS_MULTIPROC_DIR else LocalStore()
+            _default_registry = MetricsRegistry(store)
+        return _default_registry
@@ -0,0 +1,183 @@
+"""
+Client-side rate limiting for outgoing Gemini calls: RPM and TPM token buckets plus a max-in-flight cap
+"""
+
+import os
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Optional
+
+from common.metrics import get_registry
+
+DEFAULT_RPM = float(os.getenv("GEMINI_RPM", "2000"))
+DEFAULT_TPM = float(os.getenv("GEMINI_TPM", "4000000"))
+DEFAULT_MAX_IN_FLIGHT = int(os.getenv("GEMINI_MAX_IN_FLIGHT", "100"))
+
+QUEUE_WAIT = get_registry().histogram("gemini_queue_wait_seconds", "Time Gemini calls waited for rate-limit admission")
+
+class QueueTimeoutError(TimeoutError):
+    """The caller's deadline ran out before the limiter could admit it"""
+
+def estimate_tokens(prompt: str, max_output_tokens: int = 0) -> int:
+    # ~4 characters per token is close enough for budgeting
+    return len(prompt) // 4 + max_output_tokens
+
+class TokenBucket:
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def reserve(self, amount: float) -> float:
+        """Take `amount` now, going into debt if needed; returns seconds until the debt is repaid"""
+        # Each caller books its slot at call time, so waiters are served in arrival order
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+    
+    def refund(self, amount: float):
+        """Give back a reservation whose call never went out"""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+class RateLimiter:
+    def __init__(self, requests_per_minute: float = DEFAULT_RPM, tokens_per_minute: float = DEFAULT_TPM,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_in_flight = max_in_flight
+        
+        self._semaphore = threading.BoundedSemaphore(max_in_flight)
+        self._async_semaphore: Optional[asyncio.Semaphore] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        
+        self.queue_depth = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+    
+    def _reserve(self, tokens: int, timeout: Optional[float]) -> float:
+        delay = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        if timeout is not None and delay > timeout:
+            # Sleeping would only end past the deadline; fail now and leave the quota to callers that can use it
+            self._refund(tokens)
+            raise QueueTimeoutError(f"Rate limit wait of {delay:.1f}s exceeds the {timeout:.1f}s left")
+        return delay
+    
+    def _refund(self, tokens: int):
+        self.requests.refund(1)
+        self.tokens.refund(tokens)
+    
+    def _enter_queue(self):
+        with self._lock:
+            self.queue_depth += 1
+    
+    def _leave_queue(self, started: float, admitted: bool):
+        waited = time.monotonic() - started
+        with self._lock:
+            self.queue_depth -= 1
+            if admitted:
+                self.in_flight += 1
+                self.admitted += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+        if admitted:
+            QUEUE_WAIT.observe(waited)
+    
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+    
+    @contextmanager
+    def limit(self, tokens: int, timeout: Optional[float] = None) -> Iterator[None]:
+        """Wait for RPM/TPM budget and an in-flight slot; raises QueueTimeoutError if that takes over `timeout`"""
+        started = time.monotonic()
+        reserved = admitted = False
+        self._enter_queue()
+        try:
+            delay = self._reserve(tokens, timeout)
+            reserved = True
+            time.sleep(delay)
+            remaining = None if timeout is None else max(timeout - (time.monotonic() - started), 0.0)
+            if not self._semaphore.acquire(timeout=remaining):
+                raise QueueTimeoutError(f"No Gemini call slot within {timeout:.1f}s")
+            admitted = True
+        finally:
+            if reserved and not admitted:
+                self._refund(tokens)
+            self._leave_queue(started, admitted)
+        
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+            self._release()
+    
+    @asynccontextmanager
+    async def alimit(self, tokens: int, timeout: Optional[float] = None) -> AsyncIterator[None]:
+        semaphore = self._get_async_semaphore()
+        started = time.monotonic()
+        reserved = admitted = False
+        self._enter_queue()
+        try:
+            delay = self._reserve(tokens, timeout)
+            reserved = True
+            await asyncio.sleep(delay)
+            remaining = None if timeout is None else max(timeout - (time.monotonic() - started), 0.0)
+            try:
+                await asyncio.wait_for(semaphore.acquire(), remaining)
+            except asyncio.TimeoutError:
+                raise QueueTimeoutError(f"No Gemini call slot within {timeout:.1f}s") from None
+            admitted = True
+        finally:
+            # Also reached when the waiting task is cancelled, so a dropped request does not keep its booking
+            if reserved and not admitted:
+                self._refund(tokens)
+            self._leave_queue(started, admitted)
+        
+        try:
+            yield
+        finally:
+            semaphore.release()
+            self._release()
+    
+    def _get_async_semaphore(self) -> asyncio.Semaphore:
+        # asyncio.Semaphore queues waiters FIFO but is tied to one event loop
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            self._async_semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._async_loop = loop
+        return self._async_semaphore
+    
+    def stats(self) -> dict:
+        return {
+            "requests_per_minute": self.requests.per_minute,
+            "tokens_per_minute": self.tokens.per_minute,
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "admitted": self.admitted,
+            "avg_wait_ms": self.total_wait / max(self.admitted, 1) * 1000,
+            "max_wait_ms": self.max_wait * 1000
+        }
+
+_default_limiter: Optional[RateLimiter] = None
+_default_lock = threading.Lock()
+
+def get_rate_limiter() -> RateLimiter:
+    """Process-wide limiter shared by every Gemini client"""
+    global _default_limiter
+    with _default_lock:
+        if _default_limiter is None:
+            _default_limiter = RateLimiter()
+        return _default_limiter
@@ -0,0 +1,213 @@
+"""
+Exact-match LLM response cache with LRU eviction, TTL and an optional sqlite tier
+"""
+
+import os
+import json
+import time
+import queue
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("LLM_CACHE_SIZE", "1000"))
+DEFAULT_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+DEFAULT_DB_PATH = os.getenv("LLM_CACHE_DB") or None
+DEFAULT_WRITE_QUEUE_SIZE = int(os.getenv("LLM_CACHE_WRITE_QUEUE_SIZE", "10000"))
+DEFAULT_DB_TIMEOUT_SECONDS = float(os.getenv("LLM_CACHE_DB_TIMEOUT_SECONDS", "5"))
+
+logger = logging.getLogger(__name__)
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.lower().split())
+
+class ResponseCache:
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 db_path: Optional[str] = DEFAULT_DB_PATH, write_queue_size: int = DEFAULT_WRITE_QUEUE_SIZE,
+                 db_timeout: float = DEFAULT_DB_TIMEOUT_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        
+        # key -> (expires_at, response), least recently used first
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        # Bounded so a stalled disk costs dropped persistence, not unbounded memory
+        self._pending: queue.Queue = queue.Queue(maxsize=write_queue_size)
+        self._writer: Optional[threading.Thread] = None
+        
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self.dropped_writes = 0
+        self.failed_writes = 0
+        
+        if db_path:
+            # Another process holding the write lock makes a commit wait this long, then raise
+            self._db = sqlite3.connect(db_path, timeout=db_timeout, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, expires_at REAL, response TEXT)")
+            self._db.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+            # Write-behind: set() only queues the row, so callers on an event loop never wait on a disk commit
+            self._writer = threading.Thread(target=self._write_behind, name="response-cache-writer", daemon=True)
+            self._writer.start()
+    
+    @staticmethod
+    def make_key(prompt: str, model: str, temperature: float = 0.7, max_output_tokens: int = 150) -> str:
+        config = json.dumps({"temperature": temperature, "maxOutputTokens": max_output_tokens}, sort_keys=True)
+        raw = f"{model}\n{config}\n{normalize_prompt(prompt)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        response = self._get_memory(key)
+        if response is None and self._db is not None:
+            response = self._get_disk(key)
+        if response is None:
+            self._count_miss()
+        return response
+    
+    async def aget(self, key: str) -> Optional[str]:
+        """get() for code on an event loop: memory hits stay inline, the sqlite tier is read in a worker thread"""
+        response = self._get_memory(key)
+        if response is None and self._db is not None:
+            response = await asyncio.to_thread(self._get_disk, key)
+        if response is None:
+            self._count_miss()
+        return response
+    
+    def _get_memory(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self._entries[key]
+            return None
+    
+    def _get_disk(self, key: str) -> Optional[str]:
+        with self._db_lock:
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT expires_at, response FROM responses WHERE key = ?", (key,)).fetchone()
+        if not row or row[0] <= time.time():
+            return None
+        
+        with self._lock:
+            self._store(key, row[0], row[1])
+            self.hits += 1
+            self.disk_hits += 1
+        return row[1]
+    
+    def _count_miss(self):
+        with self._lock:
+            self.misses += 1
+    
+    def set(self, key: str, response: str):
+        expires_at = time.time() + self.ttl_seconds
+        
+        with self._lock:
+            self._store(key, expires_at, response)
+        
+        if self._writer is not None:
+            try:
+                self._pending.put_nowait((key, expires_at, response))
+            except queue.Full:
+                # The memory tier already has it; only the restart copy is lost
+                with self._lock:
+                    self.dropped_writes += 1
+    
+    def _write_behind(self):
+        # Whatever queued up while the last commit ran goes into one transaction
+        while True:
+            rows = [self._pending.get()]
+            while True:
+                try:
+                    rows.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            
+            stop = None in rows
+            rows = [row for row in rows if row is not None]
+            if rows:
+                try:
+                    with self._db_lock:
+                        self._db.executemany("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", rows)
+                        self._db.commit()
+                except sqlite3.Error as e:
+                    # One bad batch (locked or full disk) must not kill the writer for the rest of the process
+                    self.failed_writes += len(rows)
+                    logger.error(f"⚠️  Response cache write of {len(rows)} rows failed: {e}")
+                    with self._db_lock:
+                        if self._db.in_transaction:
+                            self._db.rollback()
+            if stop:
+                return
+    
+    def _store(self, key: str, expires_at: float, response: str):
+        self._entries[key] = (expires_at, response)
+        self._entries.move_to_end(key)
+        
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def save(self, path: str) -> int:
+        """Write the unexpired memory-tier entries, least recently used first, for a warm restart"""
+        now = time.time()
+        with self._lock:
+            entries = [[key, expires_at, response] for key, (expires_at, response) in self._entries.items()
+                       if expires_at > now]
+        
+        tmp_path = f"{path}.{os.getpid()}.tmp"  # workers may snapshot to the same directory at once
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, path)
+        return len(entries)
+    
+    def load(self, path: str) -> int:
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+        
+        now = time.time()
+        loaded = 0
+        with self._lock:
+            for key, expires_at, response in entries:
+                if expires_at > now:
+                    self._store(key, expires_at, response)
+                    loaded += 1
+        return loaded
+    
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "evictions": self.evictions,
+            "dropped_writes": self.dropped_writes,
+            "failed_writes": self.failed_writes,
+            "hit_rate": self.hits / max(lookups, 1)
+        }
+    
+    def close(self):
+        """Flush queued writes to sqlite and close it"""
+        if self._writer is not None:
+            self._pending.put(None)
+            self._writer.join()
+            self._writer = None
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+                self._db = None
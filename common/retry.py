@@ -0,0 +1,174 @@
+"""
+Retry policy for Gemini calls: retryable-error classification, jittered exponential backoff,
+an overall deadline per request and optional hedged requests
+"""
+
+import os
+import time
+import random
+import asyncio
+import threading
+import httpx
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from common.rate_limit import QueueTimeoutError
+
+T = TypeVar("T")
+
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("GEMINI_MAX_ATTEMPTS", "3"))
+DEFAULT_DEADLINE_SECONDS = float(os.getenv("GEMINI_DEADLINE_SECONDS", "30"))
+DEFAULT_HEDGE = os.getenv("GEMINI_HEDGE", "false").lower() in ("1", "true", "yes")
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, QueueTimeoutError):
+        return False  # our own rate limiter ran out of deadline; Gemini never saw the call
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    if isinstance(error, httpx.HTTPStatusError):
+        try:
+            return float(error.response.headers.get("retry-after", ""))
+        except ValueError:
+            return None
+    return None
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS, base_delay: float = 0.25, max_delay: float = 4.0,
+                 deadline: float = DEFAULT_DEADLINE_SECONDS, hedge: bool = DEFAULT_HEDGE,
+                 hedge_min_samples: int = 20):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        
+        self._latencies: deque[float] = deque(maxlen=200)
+        self._lock = threading.Lock()
+        
+        self.attempts = 0
+        self.retries = 0
+        self.deadline_exceeded = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+    
+    def backoff(self, attempt: int) -> float:
+        # "Full jitter": spreads retries from many clients instead of synchronising them
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+    
+    def hedge_delay(self) -> Optional[float]:
+        """Observed p95 latency, or None until there are enough samples to trust it"""
+        with self._lock:
+            if not self.hedge or len(self._latencies) < self.hedge_min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+    
+    def _record(self, started: float):
+        with self._lock:
+            self._latencies.append(time.monotonic() - started)
+    
+    def _next_delay(self, error: Exception, attempt: int, deadline_at: float) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None if the error should be raised"""
+        if not is_retryable(error) or attempt + 1 >= self.max_attempts:
+            return None
+        
+        delay = retry_after_seconds(error) or self.backoff(attempt)
+        if time.monotonic() + delay >= deadline_at:
+            self.deadline_exceeded += 1
+            return None
+        
+        self.retries += 1
+        return delay
+    
+    def call(self, fn: Callable[[float], T], deadline: Optional[float] = None) -> T:
+        """Run fn(remaining_seconds) until it succeeds or the policy gives up"""
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        
+        while True:
+            started = time.monotonic()
+            self.attempts += 1
+            try:
+                result = fn(deadline_at - started)
+            except Exception as e:
+                delay = self._next_delay(e, attempt, deadline_at)
+                if delay is None:
+                    raise
+                attempt += 1
+                time.sleep(delay)
+                continue
+            
+            self._record(started)
+            return result
+    
+    async def acall(self, fn: Callable[[float], Awaitable[T]], deadline: Optional[float] = None) -> T:
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        
+        while True:
+            started = time.monotonic()
+            self.attempts += 1
+            try:
+                result = await self._hedged(fn, deadline_at - started)
+            except Exception as e:
+                delay = self._next_delay(e, attempt, deadline_at)
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            
+            self._record(started)
+            return result
+    
+    async def _hedged(self, fn: Callable[[float], Awaitable[T]], remaining: float) -> T:
+        """Fire a second request once the first has run past p95, and take whichever finishes first"""
+        hedge_delay = self.hedge_delay()
+        if hedge_delay is None or hedge_delay >= remaining:
+            return await fn(remaining)
+        
+        first = asyncio.ensure_future(fn(remaining))
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if done:
+                return first.result()
+            
+            self.hedges += 1
+            second = asyncio.ensure_future(fn(remaining - hedge_delay))
+            tasks.add(second)
+            
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    def stats(self) -> dict:
+        return {
+            "max_attempts": self.max_attempts,
+            "deadline_seconds": self.deadline,
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "deadline_exceeded": self.deadline_exceeded,
+            "hedging": self.hedge,
+            "hedge_delay_ms": (self.hedge_delay() or 0) * 1000,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins
+        }
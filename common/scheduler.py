@@ -0,0 +1,161 @@
+"""
+Priority-aware scheduler for scarce LLM capacity: weighted share per priority class,
+round-robin across users inside a class, and aging so low-priority work is never starved
+"""
+
+import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from common.metrics import get_registry
+
+DEFAULT_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", "32"))
+DEFAULT_MAX_WAIT_SECONDS = float(os.getenv("SCHEDULER_MAX_WAIT_SECONDS", "2"))
+
+# Share of freed slots each class gets while all of them have work waiting
+DEFAULT_WEIGHTS = {"high": 8, "medium": 3, "low": 1}
+
+class _Waiter:
+    __slots__ = ("user_id", "future", "enqueued_at")
+    
+    def __init__(self, user_id: str, future: asyncio.Future):
+        self.user_id = user_id
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+class _PriorityClass:
+    def __init__(self, name: str, weight: int):
+        self.name = name
+        self.stride = 1.0 / weight
+        self.pass_value = 0.0
+        self.users: OrderedDict[str, deque[_Waiter]] = OrderedDict()
+        self.arrivals: deque[_Waiter] = deque()  # oldest first, for aging; served waiters are pruned lazily
+        self.waiting = 0
+        
+        registry = get_registry()
+        self.wait = registry.histogram("scheduler_wait_seconds", "Time LLM-bound requests queued for a slot", priority=name)
+        self.dispatched = registry.counter("scheduler_dispatched_total", "LLM-bound requests given a slot", priority=name)
+        self.aged = registry.counter("scheduler_aged_total", "Requests promoted after waiting past the limit", priority=name)
+    
+    def push(self, waiter: _Waiter):
+        self.users.setdefault(waiter.user_id, deque()).append(waiter)
+        self.arrivals.append(waiter)
+        self.waiting += 1
+    
+    def discard(self, waiter: _Waiter):
+        queue = self.users.get(waiter.user_id)
+        if not queue or waiter not in queue:
+            return
+        queue.remove(waiter)
+        if not queue:
+            del self.users[waiter.user_id]
+        self.waiting -= 1
+    
+    def oldest(self) -> Optional[_Waiter]:
+        while self.arrivals and self.arrivals[0].future.done():
+            self.arrivals.popleft()
+        return self.arrivals[0] if self.arrivals else None
+    
+    def pop_round_robin(self) -> _Waiter:
+        # Users take turns, so one user with many queued messages cannot crowd out the others
+        user_id, queue = next(iter(self.users.items()))
+        waiter = queue.popleft()
+        if queue:
+            self.users.move_to_end(user_id)
+        else:
+            del self.users[user_id]
+        self.waiting -= 1
+        return waiter
+
+class PriorityScheduler:
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, weights: Optional[dict[str, int]] = None,
+                 max_wait: float = DEFAULT_MAX_WAIT_SECONDS):
+        self.concurrency = concurrency
+        self.max_wait = max_wait
+        self.available = concurrency
+        self.classes = {name: _PriorityClass(name, weight) for name, weight in (weights or DEFAULT_WEIGHTS).items()}
+    
+    @asynccontextmanager
+    async def slot(self, priority: str, user_id: str) -> AsyncIterator[None]:
+        """Hold one of `concurrency` slots for the duration of an LLM call"""
+        cls = self.classes[priority]
+        started = time.monotonic()
+        
+        if self.available > 0 and not any(c.waiting for c in self.classes.values()):
+            self.available -= 1
+        else:
+            if not cls.waiting:
+                # A class returning from idle starts level with the busiest one instead of with banked credit
+                cls.pass_value = max(cls.pass_value, min((c.pass_value for c in self.classes.values() if c.waiting),
+                                                         default=cls.pass_value))
+            waiter = _Waiter(user_id, asyncio.get_running_loop().create_future())
+            cls.push(waiter)
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                if waiter.future.done() and not waiter.future.cancelled():
+                    self._release()  # granted and cancelled in the same tick; hand the slot on
+                else:
+                    cls.discard(waiter)
+                raise
+        
+        cls.wait.observe(time.monotonic() - started)
+        cls.dispatched.inc()
+        try:
+            yield
+        finally:
+            self._release()
+    
+    def _release(self):
+        self.available += 1
+        while self.available > 0:
+            waiter = self._next()
+            if waiter is None:
+                return
+            if waiter.future.done():
+                continue  # cancelled while queued
+            self.available -= 1
+            waiter.future.set_result(None)
+    
+    def _next(self) -> Optional[_Waiter]:
+        busy = [cls for cls in self.classes.values() if cls.waiting]
+        if not busy:
+            return None
+        
+        # Starvation protection: anything queued past max_wait goes first, oldest first
+        now = time.monotonic()
+        aged = [(waiter.enqueued_at, cls, waiter) for cls in busy
+                if (waiter := cls.oldest()) and now - waiter.enqueued_at >= self.max_wait]
+        if aged:
+            _, cls, waiter = min(aged, key=lambda item: item[0])
+            cls.discard(waiter)
+            cls.aged.inc()
+            return waiter
+        
+        # Stride scheduling: the class with the lowest pass goes next, then advances by 1/weight
+        cls = min(busy, key=lambda c: c.pass_value)
+        cls.pass_value += cls.stride
+        return cls.pop_round_robin()
+    
+    @property
+    def queue_depth(self) -> int:
+        return sum(cls.waiting for cls in self.classes.values())
+    
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "in_use": self.concurrency - self.available,
+            "classes": {
+                name: {
+                    "queue_depth": cls.waiting,
+                    "waiting_users": len(cls.users),
+                    "dispatched": cls.dispatched.value,
+                    "aged": cls.aged.value,
+                    "wait": cls.wait.summary()
+                }
+                for name, cls in self.classes.items()
+            }
+        }
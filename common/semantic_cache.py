@@ -0,0 +1,113 @@
+"""
+Semantic response cache: answers paraphrases of messages the LLM has already answered
+"""
+
+import os
+import time
+import threading
+import numpy as np
+from typing import Optional
+
+from common.embeddings import HashingEmbedder
+from common.faq_index import tokenize
+
+DEFAULT_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+DEFAULT_CAPACITY = int(os.getenv("SEMANTIC_CACHE_SIZE", "1000"))
+DEFAULT_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+# Outweighs the dozens of character trigrams per message, so a reordered message falls below the threshold
+DEFAULT_BIGRAM_WEIGHT = 2.0
+
+class SemanticCache:
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, capacity: int = DEFAULT_CAPACITY,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS, embedder: Optional[HashingEmbedder] = None):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self.embedder = embedder or HashingEmbedder(bigram_weight=DEFAULT_BIGRAM_WEIGHT)
+        
+        # Fixed-size ring buffer: once full, the oldest entry is overwritten
+        self._vectors = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+        self._expires_at = np.zeros(capacity, dtype=np.float64)
+        self._responses: list[Optional[str]] = [None] * capacity
+        self._next = 0
+        self._size = 0
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+    
+    def embed(self, message: str) -> np.ndarray:
+        # Stopwords made "shipping address" and "billing address" look alike; negation is kept,
+        # since "cancel my order" and "not cancel my order" need different answers
+        return self.embedder.embed(" ".join(tokenize(message, keep_negation=True)))
+    
+    def get(self, message: str) -> Optional[str]:
+        query = self.embed(message)
+        
+        with self._lock:
+            if self._size:
+                scores = self._vectors[:self._size] @ query
+                scores[self._expires_at[:self._size] <= time.time()] = -1.0
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self.hits += 1
+                    return self._responses[best]
+            
+            self.misses += 1
+            return None
+    
+    def add(self, message: str, response: str):
+        vector = self.embed(message)
+        
+        with self._lock:
+            self._insert(vector, time.time() + self.ttl_seconds, response)
+    
+    def _insert(self, vector: np.ndarray, expires_at: float, response: str):
+        slot = self._next
+        self._vectors[slot] = vector
+        self._expires_at[slot] = expires_at
+        self._responses[slot] = response
+        self._next = (slot + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+    
+    def save(self, path: str) -> int:
+        """Write unexpired entries oldest first as an .npz, for a warm restart"""
+        now = time.time()
+        with self._lock:
+            start = self._next if self._size == self.capacity else 0
+            live = [slot for slot in ((start + i) % self.capacity for i in range(self._size))
+                    if self._expires_at[slot] > now]
+            vectors = self._vectors[live]
+            expires_at = self._expires_at[live]
+            responses = np.array([self._responses[slot] for slot in live], dtype=str)
+        
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"  # workers may snapshot to the same directory at once
+        np.savez(tmp_path, vectors=vectors, expires_at=expires_at, responses=responses)
+        os.replace(tmp_path, path)
+        return len(live)
+    
+    def load(self, path: str) -> int:
+        with np.load(path) as data:
+            vectors, expires_at, responses = data["vectors"], data["expires_at"], data["responses"]
+        if vectors.ndim != 2 or vectors.shape[1] != self.embedder.dim:
+            return 0  # saved with a different embedder
+        
+        now = time.time()
+        loaded = 0
+        with self._lock:
+            for vector, expires, response in zip(vectors, expires_at, responses):
+                if expires > now:
+                    self._insert(vector, float(expires), str(response))
+                    loaded += 1
+        return loaded
+    
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": self._size,
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / max(lookups, 1)
+        }
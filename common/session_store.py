@@ -0,0 +1,116 @@
+"""
+Conversation sessions: a ring buffer of recent turns per session, LRU + TTL eviction under a global memory cap
+"""
+
+import os
+import sys
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Optional
+
+DEFAULT_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "6"))
+DEFAULT_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "1800"))
+DEFAULT_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Rough fixed cost of a session's bookkeeping (dict slot, object, deque) on top of its turns
+SESSION_OVERHEAD_BYTES = 800
+
+class _Session:
+    __slots__ = ("turns", "size", "last_seen")
+    
+    def __init__(self, max_turns: int, size: int):
+        self.turns: deque[bytes] = deque(maxlen=max_turns)
+        self.size = size
+        self.last_seen = time.monotonic()
+
+def encode_turn(message: str, response: str) -> bytes:
+    # One bytes object per turn instead of a tuple of two str objects
+    return f"{message.replace(chr(0), '')}\0{response.replace(chr(0), '')}".encode("utf-8")
+
+def decode_turn(turn: bytes) -> tuple[str, str]:
+    message, response = turn.decode("utf-8").split("\0", 1)
+    return message, response
+
+class SessionStore:
+    def __init__(self, max_turns: int = DEFAULT_MAX_TURNS, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        
+        # Keyed by (user_id, session_id): session ids come from clients, so one alone must not reach another user's turns
+        self._sessions: OrderedDict[tuple[str, str], _Session] = OrderedDict()  # least recently used first
+        self.bytes = 0
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+    
+    @staticmethod
+    def new_id() -> str:
+        return f"session_{uuid.uuid4().hex}"
+    
+    def _get(self, key: tuple[str, str]) -> Optional[_Session]:
+        session = self._sessions.get(key)
+        if session is None:
+            return None
+        if time.monotonic() - session.last_seen > self.ttl_seconds:
+            self._drop(key)
+            self.expired += 1
+            return None
+        session.last_seen = time.monotonic()
+        self._sessions.move_to_end(key)
+        return session
+    
+    def history(self, user_id: str, session_id: str) -> list[tuple[str, str]]:
+        """Recent (message, response) turns, oldest first; empty for unknown, expired or other users' sessions"""
+        session = self._get((user_id, session_id))
+        return [decode_turn(turn) for turn in session.turns] if session else []
+    
+    def append(self, user_id: str, session_id: str, message: str, response: str):
+        key = (user_id, session_id)
+        session = self._get(key)
+        if session is None:
+            session = _Session(self.max_turns, SESSION_OVERHEAD_BYTES + len(user_id) + len(session_id))
+            self._sessions[key] = session
+            self.bytes += session.size
+            self.created += 1
+        
+        turn = encode_turn(message, response)
+        if len(session.turns) == self.max_turns:
+            removed = sys.getsizeof(session.turns[0])
+            session.size -= removed
+            self.bytes -= removed
+        session.turns.append(turn)
+        session.size += sys.getsizeof(turn)
+        self.bytes += sys.getsizeof(turn)
+        
+        self._evict()
+    
+    def _drop(self, key: tuple[str, str]):
+        session = self._sessions.pop(key)
+        self.bytes -= session.size
+    
+    def _evict(self):
+        # Least recently used sessions sit at the front, so expired ones are found there too
+        now = time.monotonic()
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if now - session.last_seen > self.ttl_seconds:
+                self.expired += 1
+            elif self.bytes > self.max_bytes:
+                self.evicted += 1
+            else:
+                break
+            self._drop(key)
+    
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "max_turns": self.max_turns,
+            "created": self.created,
+            "expired": self.expired,
+            "evicted": self.evicted
+        }
@@ -0,0 +1,42 @@
+"""
+Single-flight request coalescing: concurrent callers with the same key share one upstream call
+"""
+
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+class SingleFlight:
+    def __init__(self):
+        self._in_flight: dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+    
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._in_flight.get(key)
+        
+        if task is None:
+            self.calls += 1
+            # The upstream call runs in its own task so a disconnecting caller
+            # cancels only its own wait, never the result the others are waiting on
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.coalesced += 1
+        
+        return await asyncio.shield(task)
+    
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every waiter went away
+    
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._in_flight),
+            "upstream_calls": self.calls,
+            "coalesced": self.coalesced
+        }
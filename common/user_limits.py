@@ -0,0 +1,151 @@
+"""
+Per-user and per-session sliding-window request limits, checked before any matching or LLM work
+"""
+
+import os
+import json
+import math
+import time
+import logging
+from typing import Optional, Union
+
+from common.admission import OverloadedError
+from common.metrics import get_registry
+
+DEFAULT_USER_LIMIT = int(os.getenv("USER_RATE_LIMIT", "60"))
+DEFAULT_SESSION_LIMIT = int(os.getenv("SESSION_RATE_LIMIT", "30"))
+DEFAULT_WINDOW_SECONDS = float(os.getenv("RATE_LIMIT_WINDOW_SECONDS", "60"))
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "")
+
+logger = logging.getLogger(__name__)
+
+class RateLimitedError(OverloadedError):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message, 429, retry_after)
+
+class LocalWindowStore:
+    """Per-key counts of the current and previous window in process memory; the default, and the test stand-in"""
+    
+    def __init__(self):
+        self._counts: dict[str, tuple[int, int, int]] = {}  # key -> (window, previous count, current count)
+        self._pruned_window = 0
+    
+    async def counts(self, key: str, window: int) -> tuple[int, int]:
+        entry = self._counts.get(key)
+        if entry is None:
+            return 0, 0
+        stored_window, previous, current = entry
+        if stored_window == window:
+            return previous, current
+        if stored_window == window - 1:
+            return current, 0
+        return 0, 0
+    
+    async def incr(self, key: str, window: int, ttl: int):
+        previous, current = await self.counts(key, window)
+        self._counts[key] = (window, previous, current + 1)
+        
+        # Once per window, forget keys that have been idle for two windows so memory tracks active users
+        if window > self._pruned_window:
+            self._pruned_window = window
+            self._counts = {key: entry for key, entry in self._counts.items() if entry[0] >= window - 1}
+
+class RedisWindowStore:
+    """Counts shared by every worker; takes any redis.asyncio-compatible client"""
+    
+    def __init__(self, client, prefix: str = "ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+    
+    @classmethod
+    def from_url(cls, url: str) -> "RedisWindowStore":
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_REDIS_URL needs the redis package: pip install redis") from e
+        return cls(redis.Redis.from_url(url))
+    
+    async def counts(self, key: str, window: int) -> tuple[int, int]:
+        previous, current = await self.client.mget(f"{self.prefix}{key}:{window - 1}", f"{self.prefix}{key}:{window}")
+        return int(previous or 0), int(current or 0)
+    
+    async def incr(self, key: str, window: int, ttl: int):
+        name = f"{self.prefix}{key}:{window}"
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.incr(name)
+            pipe.expire(name, ttl)
+            await pipe.execute()
+
+class SlidingWindowLimiter:
+    def __init__(self, limit: int, window_seconds: float = DEFAULT_WINDOW_SECONDS,
+                 store: Optional[Union[LocalWindowStore, RedisWindowStore]] = None):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.store = store or LocalWindowStore()
+    
+    async def check(self, key: str):
+        """Count one request against `key`, or raise RateLimitedError without counting it"""
+        if self.limit <= 0:
+            return
+        
+        # Wall clock, not monotonic: workers sharing a store must agree on window boundaries
+        position = time.time() / self.window_seconds
+        window = int(position)
+        elapsed = position - window
+        
+        previous, current = await self.store.counts(key, window)
+        # Sliding-window counter: the previous window counts in proportion to how much of it still overlaps
+        excess = previous * (1 - elapsed) + current + 1 - self.limit
+        if excess > 0:
+            if current + 1 > self.limit or not previous:
+                wait = (1 - elapsed) * self.window_seconds
+            else:
+                wait = excess / previous * self.window_seconds
+            raise RateLimitedError("Rate limit exceeded", max(1, math.ceil(wait)))
+        
+        await self.store.incr(key, window, ttl=math.ceil(self.window_seconds * 2))
+
+class RequestLimits:
+    def __init__(self, user_limit: int = DEFAULT_USER_LIMIT, session_limit: int = DEFAULT_SESSION_LIMIT,
+                 window_seconds: float = DEFAULT_WINDOW_SECONDS,
+                 store: Optional[Union[LocalWindowStore, RedisWindowStore]] = None):
+        if store is None:
+            store = RedisWindowStore.from_url(RATE_LIMIT_REDIS_URL) if RATE_LIMIT_REDIS_URL else LocalWindowStore()
+        self.window_seconds = window_seconds
+        self.user = SlidingWindowLimiter(user_limit, window_seconds, store)
+        self.session = SlidingWindowLimiter(session_limit, window_seconds, store)
+        
+        registry = get_registry()
+        self.rejected = {
+            scope: registry.counter("rate_limited_total", "Requests rejected by per-client rate limits", scope=scope)
+            for scope in ("user", "session")
+        }
+        self.store_errors = registry.counter("rate_limit_store_errors_total",
+                                             "Rate-limit checks let through because the window store failed")
+    
+    async def _check(self, scope: str, limiter: SlidingWindowLimiter, key: str):
+        try:
+            await limiter.check(key)
+        except RateLimitedError:
+            self.rejected[scope].inc()
+            raise
+        except Exception as e:
+            # Fail open: a Redis outage should not turn every request into a 500
+            self.store_errors.inc()
+            logger.warning(f"⚠️  Rate-limit store failed, letting the request through: {e!r}")
+    
+    async def check(self, user_id: str, session_id: Optional[str] = None):
+        await self._check("user", self.user, f"user:{user_id}")
+        if session_id:
+            # Scoped to the user, so nobody can exhaust another user's session by reusing its id
+            await self._check("session", self.session, f"session:{json.dumps([user_id, session_id])}")
+    
+    def stats(self) -> dict:
+        return {
+            "user_limit": self.user.limit,
+            "session_limit": self.session.limit,
+            "window_seconds": self.window_seconds,
+            "rejected_user": self.rejected["user"].value,
+            "rejected_session": self.rejected["session"].value,
+            "store_errors": self.store_errors.value
+        }
@@ -3,36 +3,62 @@
 Support Agent with Google Gemini
 """
 
-import requests
 import os
+import sys
+from typing import Iterator
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.gemini_client import FallbackStream, get_client
+from common.response_cache import ResponseCache
+from common.semantic_cache import SemanticCache
+from common.keyword_matcher import KeywordMatcher
+from common.faq_index import HybridFAQIndex
+
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 GEMINI_MODEL = "gemini-2.0-flash"
-GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
 
+# Answer -> the ways customers ask for it; whole questions give the index enough words to tell topics apart
 FAQS = {
-    "password": "Click 'Forgot Password' on login page",
-    "billing": "Contact billing@company.com", 
-    "return": "Go to Orders > Return Item"
+    "Click 'Forgot Password' on login page": [
+        "How do I reset my password?", "I forgot my password", "My password is not working", "I can't log in"
+    ],
+    "Contact billing@company.com": [
+        "I have a billing question", "Why was I charged twice?", "There is a wrong charge on my bill"
+    ],
+    "Go to Orders > Return Item": [
+        "How do I return an item?", "What is your return policy?", "I want to send a product back"
+    ]
 }
 
+FALLBACK_RESPONSES = [
+    ("I understand your frustration. Let me escalate this to a manager.", ["angry", "terrible", "manager"]),
+    ("Standard shipping takes 3-5 business days. Track in 'My Orders'.", ["ship", "delivery", "track"]),
+    ("Go to 'My Orders' > 'Cancel'. Refunds process in 5-7 days.", ["cancel", "refund"])
+]
+
+KEYWORDS = KeywordMatcher().add_groups("fallback", FALLBACK_RESPONSES)
+
+# Set FAQ_PATH to a .json/.csv corpus to answer from thousands of entries instead of the built-in three
+FAQ_INDEX = HybridFAQIndex.from_file(os.environ["FAQ_PATH"]) if os.getenv("FAQ_PATH") else HybridFAQIndex.from_dict(
+    {question: answer for answer, questions in FAQS.items() for question in questions})
+
 def lookup_faq(query: str) -> str:
-    for keyword, answer in FAQS.items():
-        if keyword in query.lower():
-            return answer
-    return None
+    match = FAQ_INDEX.lookup(query)
+    return match.answer if match else None
 
 class SupportAgent:
     def __init__(self, api_key: str, use_llm: bool = True):
         self.api_key = api_key
-        self.api_url = f"{GEMINI_API_URL}?key={api_key}"
         self.use_llm = use_llm
+        self.cache = ResponseCache()
+        self.semantic_cache = SemanticCache()
         
         if use_llm:
+            self.client = get_client(api_key, GEMINI_MODEL)
             print(f"✅ Using Google Gemini ({GEMINI_MODEL})")
     
     def process(self, message: str) -> str:
@@ -49,37 +75,54 @@ class SupportAgent:
         
         return self._get_fallback_response(message)
     
-    def _get_llm_response(self, message: str) -> str:
-        prompt = f"You are a helpful customer support agent. Customer says: '{message}'. Provide a brief, helpful response (1-2 sentences)."
+    def process_stream(self, message: str) -> Iterator[str]:
+        faq_answer = lookup_faq(message)
+        if faq_answer:
+            yield f"I can help! {faq_answer}"
+            return
         
-        payload = {
-            "contents": [{"parts": [{"text": prompt}]}],
-            "generationConfig": {"temperature": 0.7, "maxOutputTokens": 150}
-        }
+        if self.use_llm:
+            prompt = self._build_prompt(message)
+            cache_key, cached = self._lookup_cache(message, prompt)
+            if cached is not None:
+                yield cached
+                return
+            
+            stream = FallbackStream(self.client.stream(prompt), lambda: self._get_fallback_response(message))
+            yield from stream
+            if not stream.partial and not stream.fell_back:
+                self._store_cache(message, cache_key, stream.text)
+            return
         
-        response = requests.post(self.api_url, headers={"Content-Type": "application/json"}, json=payload, timeout=30)
-        response.raise_for_status()
+        yield self._get_fallback_response(message)
+    
+    def _build_prompt(self, message: str) -> str:
+        return f"You are a helpful customer support agent. Customer says: '{message}'. Provide a brief, helpful response (1-2 sentences)."
+    
+    def _lookup_cache(self, message: str, prompt: str) -> tuple[str, str | None]:
+        cache_key = self.cache.make_key(prompt, GEMINI_MODEL)
+        cached = self.cache.get(cache_key)
+        if cached is None:
+            cached = self.semantic_cache.get(message)
+        return cache_key, cached
+    
+    def _store_cache(self, message: str, cache_key: str, response_text: str):
+        self.cache.set(cache_key, response_text)
+        self.semantic_cache.add(message, response_text)
+    
+    def _get_llm_response(self, message: str) -> str:
+        prompt = self._build_prompt(message)
         
-        result = response.json()
-        parts = result["candidates"][0].get("content", {}).get("parts", [])
-        if parts:
-            return parts[0].get("text", "").strip()
+        cache_key, cached = self._lookup_cache(message, prompt)
+        if cached is not None:
+            return cached
         
-        raise RuntimeError("Invalid response")
+        response_text = self.client.generate(prompt)
+        self._store_cache(message, cache_key, response_text)
+        return response_text
     
     def _get_fallback_response(self, message: str) -> str:
-        message_lower = message.lower()
-        
-        if any(word in message_lower for word in ["angry", "terrible", "manager"]):
-            return "I understand your frustration. Let me escalate this to a manager."
-        
-        if any(word in message_lower for word in ["ship", "delivery", "track"]):
-            return "Standard shipping takes 3-5 business days. Track in 'My Orders'."
-        
-        if any(word in message_lower for word in ["cancel", "refund"]):
-            return "Go to 'My Orders' > 'Cancel'. Refunds process in 5-7 days."
-        
-        return "I can help with passwords, billing, returns, and shipping. What do you need?"
+        return KEYWORDS.scan(message).best("fallback") or "I can help with passwords, billing, returns, and shipping. What do you need?"
 
 def demo(max_turns: int = 5):
     print("=== Support Agent Demo ===\n")
@@ -105,8 +148,10 @@ def demo(max_turns: int = 5):
             print("Please enter a question.\n")
             continue
         
-        response = agent.process(user_input)
-        print(f"Agent: {response}\n")
+        print("Agent: ", end="", flush=True)
+        for chunk in agent.process_stream(user_input):
+            print(chunk, end="", flush=True)
+        print("\n")
         turn += 1
     
     print(f"⚠️  Reached maximum of {max_turns} questions. Demo completed!")
@@ -4,16 +4,31 @@ Document Processing Multi-Agent System with Google Gemini
 use extractor and analyzer without llm, but summarizer with llm for simplicity
 """
 
-import requests
 import re
 import os
+import sys
 from dotenv import load_dotenv
 
 load_dotenv()
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.gemini_client import get_client
+from common.keyword_matcher import KeywordMatcher
+
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 GEMINI_MODEL = "gemini-2.0-flash"
-GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
+
+KEYWORDS = (KeywordMatcher()
+            .add_groups("topic", [
+                ("Finance", ['financial', 'revenue', 'profit']),
+                ("Project Management", ['project', 'requirements']),
+                ("Customer Relations", ['customer', 'feedback']),
+                ("Market Research", ['market', 'analysis'])
+            ])
+            .add_groups("sentiment", [
+                ("Positive", ['growth', 'success', 'excellent', 'strong']),
+                ("Negative", ['risk', 'challenge', 'decline'])
+            ]))
 
 def extract_text_from_document(file_path: str) -> str:
     try:
@@ -34,25 +49,12 @@ def extract_text_from_document(file_path: str) -> str:
         return "Error reading document."
 
 def analyze_document_content(text: str) -> str:
-    text_lower = text.lower()
-    topics = []
-    
-    if any(word in text_lower for word in ['financial', 'revenue', 'profit']):
-        topics.append('Finance')
-    if any(word in text_lower for word in ['project', 'requirements']):
-        topics.append('Project Management')
-    if any(word in text_lower for word in ['customer', 'feedback']):
-        topics.append('Customer Relations')
-    if any(word in text_lower for word in ['market', 'analysis']):
-        topics.append('Market Research')
+    hits = KEYWORDS.scan(text)
+    topics = hits.all("topic")
     
     percentages = re.findall(r'(\d+)%', text)
     
-    sentiment = "Neutral"
-    if any(word in text_lower for word in ['growth', 'success', 'excellent', 'strong']):
-        sentiment = "Positive"
-    elif any(word in text_lower for word in ['risk', 'challenge', 'decline']):
-        sentiment = "Negative"
+    sentiment = hits.best("sentiment") or "Neutral"
     
     result = f"Topics: {', '.join(topics) if topics else 'General'}. "
     if percentages:
@@ -69,7 +71,7 @@ class DocumentAgent:
         self.use_llm = use_llm
         
         if use_llm:
-            self.api_url = f"{GEMINI_API_URL}?key={api_key}"
+            self.client = get_client(api_key, GEMINI_MODEL)
     
     def execute_task(self, task: str, context: str = "") -> str:
         print(f"\n🤖 {self.role} executing: {task}")
@@ -94,20 +96,7 @@ class DocumentAgent:
     def _get_llm_summary(self, content: str, analysis: str) -> str:
         prompt = f"Summarize this document in 2-3 sentences:\n\nContent: {content[:500]}\n\nAnalysis: {analysis}\n\nSummary:"
         
-        payload = {
-            "contents": [{"parts": [{"text": prompt}]}],
-            "generationConfig": {"temperature": 0.7, "maxOutputTokens": 200}
-        }
-        
-        response = requests.post(self.api_url, headers={"Content-Type": "application/json"}, json=payload, timeout=30)
-        response.raise_for_status()
-        
-        result = response.json()
-        parts = result["candidates"][0].get("content", {}).get("parts", [])
-        if parts:
-            return parts[0].get("text", "").strip()
-        
-        raise RuntimeError("Invalid response")
+        return self.client.generate(prompt, max_output_tokens=200)
     
     def _get_fallback_summary(self, content: str, analysis: str) -> str:
         words = content.split()[:50]
@@ -3,15 +3,18 @@
 Multi-Agent Crew with Google Gemini
 """
 
-import requests
 import os
+import sys
 from dotenv import load_dotenv
 
 load_dotenv()
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.gemini_client import get_client
+from common.batching import generate_batch
+
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 GEMINI_MODEL = "gemini-2.0-flash"
-GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
 
 class Agent:
     def __init__(self, role: str, goal: str, api_key: str | None = None, use_llm: bool = True):
@@ -21,7 +24,7 @@ class Agent:
         self.use_llm = use_llm and api_key
         
         if self.use_llm:
-            self.api_url = f"{GEMINI_API_URL}?key={api_key}"
+            self.client = get_client(api_key, GEMINI_MODEL)
     
     def work(self, task: str) -> str:
         if self.use_llm:
@@ -33,24 +36,12 @@ class Agent:
         
         return self._get_fallback_response(task)
     
+    def build_prompt(self, task: str) -> str:
+        return f"You are a {self.role}. Your goal: {self.goal}\n\nTask: {task}\n\nProvide a concise response (2-3 sentences):"
+    
     def _get_llm_response(self, task: str) -> str:
-        prompt = f"You are a {self.role}. Your goal: {self.goal}\n\nTask: {task}\n\nProvide a concise response (2-3 sentences):"
-        
-        payload = {
-            "contents": [{"parts": [{"text": prompt}]}],
-            "generationConfig": {"temperature": 0.7, "maxOutputTokens": 150}
-        }
-        
-        response = requests.post(self.api_url, headers={"Content-Type": "application/json"}, json=payload, timeout=30)
-        response.raise_for_status()
-        
-        result = response.json()
-        parts = result["candidates"][0].get("content", {}).get("parts", [])
-        if parts:
-            text = parts[0].get("text", "").strip()
-            return f"{self.role}: {text}"
-        
-        raise RuntimeError("Invalid response")
+        text = self.client.generate(self.build_prompt(task))
+        return f"{self.role}: {text}"
     
     def _get_fallback_response(self, task: str) -> str:
         return f"{self.role}: Completed task - {task}"
@@ -60,14 +51,34 @@ class Crew:
         self.agents = agents
     
     def kickoff(self, tasks: list) -> list:
+        assigned = [(self.agents[i % len(self.agents)], task) for i, task in enumerate(tasks)]
+        answers = self._batch_llm_answers(assigned)
+        
         results = []
-        for i, task in enumerate(tasks):
-            agent = self.agents[i % len(self.agents)]
+        for i, (agent, task) in enumerate(assigned):
             print(f"\n🤖 {agent.role} working on task {i+1}...")
-            result = agent.work(task)
+            if i in answers:
+                # generate_batch already retried the items the packed request missed; don't ask Gemini again
+                result = f"{agent.role}: {answers[i]}" if answers[i] else agent._get_fallback_response(task)
+            else:
+                result = agent.work(task)
             results.append(result)
             print(f"✅ Completed")
         return results
+    
+    def _batch_llm_answers(self, assigned: list) -> dict:
+        """Pack every LLM-backed task into one Gemini request instead of a round trip each"""
+        indexes = [i for i, (agent, _) in enumerate(assigned) if agent.use_llm]
+        if len(indexes) < 2:
+            return {}
+        
+        client = assigned[indexes[0]][0].client
+        prompts = [assigned[i][0].build_prompt(assigned[i][1]) for i in indexes]
+        try:
+            return dict(zip(indexes, generate_batch(client, prompts)))
+        except Exception as e:
+            print(f"⚠️  Batched LLM call failed: {e}, running tasks one by one")
+            return {}
 
 def create_crew(api_key: str, use_llm: bool = True):
     extractor = Agent("Text Extractor", "Extract text from documents", api_key, use_llm)
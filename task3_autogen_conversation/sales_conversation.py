@@ -4,35 +4,22 @@ AutoGen Sales Conversation with Google Gemini
 """
 
 import os
-import requests
+import sys
 import autogen
 from dotenv import load_dotenv
 
 load_dotenv()
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.gemini_client import get_client
+
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 GEMINI_MODEL = "gemini-2.0-flash"
-GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
 
 def call_gemini(prompt: str) -> str:
     """Call Google Gemini API"""
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {"temperature": 0.7, "maxOutputTokens": 150}
-    }
-    
     try:
-        response = requests.post(
-            f"{GEMINI_API_URL}?key={GOOGLE_API_KEY}",
-            headers={"Content-Type": "application/json"},
-            json=payload,
-            timeout=30
-        )
-        response.raise_for_status()
-        result = response.json()
-        parts = result["candidates"][0].get("content", {}).get("parts", [])
-        if parts:
-            return parts[0].get("text", "").strip()
+        return get_client(GOOGLE_API_KEY, GEMINI_MODEL).generate(prompt)
     except Exception as e:
         print(f"⚠️  Gemini API failed: {e}")
     
@@ -90,7 +77,7 @@ if __name__ == "__main__":
 === AutoGen Sales Conversation ===
 
 📦 Installation:
-   pip install pyautogen requests
+   pip install pyautogen httpx
 
     """)
     
@@ -3,15 +3,28 @@
 LangGraph Workflow with Google Gemini
 """
 
-import requests
 import os
+import sys
 from dotenv import load_dotenv
 
 load_dotenv()
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.gemini_client import get_client
+from common.batching import generate_batch
+from common.keyword_matcher import KeywordMatcher
+
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 GEMINI_MODEL = "gemini-2.0-flash"
-GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
+
+KEYWORDS = (KeywordMatcher()
+            .add_groups("category", [
+                ("authentication", ["password", "login", "auth"]),
+                ("billing", ["bill", "payment", "charge"]),
+                ("technical", ["bug", "error", "broken"])
+            ])
+            .add_groups("urgent", [(True, ["urgent", "asap", "critical"])])
+            .add_groups("escalation", [(True, ["angry", "frustrated", "manager"])]))
 
 class WorkflowState:
     def __init__(self, message: str):
@@ -27,30 +40,19 @@ class GeminiWorkflow:
         self.use_llm = use_llm
         
         if use_llm:
-            self.api_url = f"{GEMINI_API_URL}?key={api_key}"
+            self.client = get_client(api_key, GEMINI_MODEL)
             print(f"✅ Using Google Gemini ({GEMINI_MODEL})")
     
     def categorize(self, state: WorkflowState) -> WorkflowState:
         print("→ Categorizing request...")
-        message_lower = state.message.lower()
-        
-        if any(word in message_lower for word in ["password", "login", "auth"]):
-            state.category = "authentication"
-        elif any(word in message_lower for word in ["bill", "payment", "charge"]):
-            state.category = "billing"
-        elif any(word in message_lower for word in ["bug", "error", "broken"]):
-            state.category = "technical"
-        else:
-            state.category = "general"
+        state.category = KEYWORDS.scan(state.message).best("category") or "general"
         
         print(f"   Category: {state.category}")
         return state
     
     def set_priority(self, state: WorkflowState) -> WorkflowState:
         print("→ Setting priority...")
-        message_lower = state.message.lower()
-        
-        if any(word in message_lower for word in ["urgent", "asap", "critical"]):
+        if KEYWORDS.scan(state.message).any("urgent"):
             state.priority = "high"
         elif state.category in ["billing", "technical"]:
             state.priority = "medium"
@@ -77,9 +79,7 @@ class GeminiWorkflow:
     
     def check_escalation(self, state: WorkflowState) -> WorkflowState:
         print("→ Checking escalation...")
-        message_lower = state.message.lower()
-        
-        if any(word in message_lower for word in ["angry", "frustrated", "manager"]):
+        if KEYWORDS.scan(state.message).any("escalation"):
             state.escalated = True
             if state.response:
                 state.response += "\n\nI'm escalating this to a senior agent who will contact you shortly."
@@ -89,23 +89,11 @@ class GeminiWorkflow:
         
         return state
     
+    def _build_prompt(self, state: WorkflowState) -> str:
+        return f"You are a helpful support agent. Customer message: '{state.message}' (Category: {state.category}, Priority: {state.priority}). Provide a brief, helpful response (1-2 sentences)."
+    
     def _get_llm_response(self, state: WorkflowState) -> str:
-        prompt = f"You are a helpful support agent. Customer message: '{state.message}' (Category: {state.category}, Priority: {state.priority}). Provide a brief, helpful response (1-2 sentences)."
-        
-        payload = {
-            "contents": [{"parts": [{"text": prompt}]}],
-            "generationConfig": {"temperature": 0.7, "maxOutputTokens": 150}
-        }
-        
-        response = requests.post(self.api_url, headers={"Content-Type": "application/json"}, json=payload, timeout=30)
-        response.raise_for_status()
-        
-        result = response.json()
-        parts = result["candidates"][0].get("content", {}).get("parts", [])
-        if parts:
-            return parts[0].get("text", "").strip()
-        
-        raise RuntimeError("Invalid response")
+        return self.client.generate(self._build_prompt(state))
     
     def _get_fallback_response(self, state: WorkflowState) -> str:
         responses: dict[str, str] = {
@@ -125,6 +113,28 @@ class GeminiWorkflow:
         state = self.check_escalation(state)
         
         return state
+    
+    def run_batch(self, messages: list[str]) -> list[WorkflowState]:
+        """Run many messages through the workflow with a single packed LLM request for all of them"""
+        states = [self.set_priority(self.categorize(WorkflowState(message))) for message in messages]
+        
+        responses: list[str | None] | None = None
+        if self.use_llm:
+            print(f"→ Generating {len(states)} responses in one batched request...")
+            try:
+                responses = generate_batch(self.client, [self._build_prompt(state) for state in states])
+            except Exception as e:
+                print(f"   ⚠️  Batched LLM call failed: {e}, answering one by one")
+        
+        for i, state in enumerate(states):
+            if responses is None:
+                state = self.generate_response(state)
+            else:
+                # generate_batch already retried the items the packed request missed; don't ask Gemini again
+                state.response = responses[i] or self._get_fallback_response(state)
+            states[i] = self.check_escalation(state)
+        
+        return states
 
 def demo():
     print("=== LangGraph-style Workflow Demo ===\n")
@@ -137,13 +147,13 @@ def demo():
         "The app keeps crashing, this is terrible!"
     ]
     
-    for msg in test_messages:
+    results = workflow.run_batch(test_messages)
+    
+    for msg, result in zip(test_messages, results):
         print(f"\n{'='*60}")
         print(f"Message: {msg}")
         print('='*60)
         
-        result = workflow.run(msg)
-        
         print(f"\n📊 Results:")
         print(f"   Category: {result.category}")
         print(f"   Priority: {result.priority}")
@@ -3,15 +3,17 @@
 Workflow Agent with Google Gemini
 """
 
-import requests
 import os
+import sys
 from dotenv import load_dotenv
 
 load_dotenv()
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.gemini_client import get_client
+
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 GEMINI_MODEL = "gemini-2.0-flash"
-GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
 
 class WorkflowState:
     def __init__(self):
@@ -23,7 +25,7 @@ class WorkflowAgent:
         self.use_llm = use_llm
         
         if use_llm:
-            self.api_url = f"{GEMINI_API_URL}?key={api_key}"
+            self.client = get_client(api_key, GEMINI_MODEL)
             print(f"✅ Using Google Gemini ({GEMINI_MODEL})")
     
     def validate_input(self, state: WorkflowState) -> WorkflowState:
@@ -50,36 +52,27 @@ class WorkflowAgent:
         
         if self.use_llm:
             try:
-                message = state.data.get("message", "")
-                category = state.data.get("category", "")
-                
-                prompt = f"Customer message: '{message}' (Category: {category}). Provide a brief, helpful support response (1-2 sentences)."
-                
-                payload = {
-                    "contents": [{"parts": [{"text": prompt}]}],
-                    "generationConfig": {"temperature": 0.7, "maxOutputTokens": 150}
-                }
-                
-                response = requests.post(self.api_url, headers={"Content-Type": "application/json"}, json=payload, timeout=30)
-                response.raise_for_status()
-                
-                result = response.json()
-                parts = result["candidates"][0].get("content", {}).get("parts", [])
-                if parts:
-                    state.data["response"] = parts[0].get("text", "").strip()
-                    return state
+                state.data["response"] = self.client.generate(self._build_prompt(state))
+                return state
             except Exception as e:
                 print(f"⚠️  LLM failed: {e}, using fallback")
         
-        category = state.data.get("category")
+        state.data["response"] = self._get_fallback_response(state)
+        
+        return state
+    
+    def _build_prompt(self, state: WorkflowState) -> str:
+        message = state.data.get("message", "")
+        category = state.data.get("category", "")
+        return f"Customer message: '{message}' (Category: {category}). Provide a brief, helpful support response (1-2 sentences)."
+    
+    def _get_fallback_response(self, state: WorkflowState) -> str:
         responses = {
             "auth": "Reset your password on the login page",
             "billing": "Contact billing@company.com",
             "general": "Thanks for contacting us"
         }
-        state.data["response"] = responses.get(category, "We'll help you")
-        
-        return state
+        return responses.get(state.data.get("category"), "We'll help you")
     
     def run_workflow(self, message: str) -> str:
         state = WorkflowState()
@@ -7,10 +7,24 @@ Demonstrates: Stateful workflows, conditional routing, error handling
 from typing import TypedDict, Literal, Optional
 from langgraph.graph import StateGraph, END, START
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.keyword_matcher import KeywordMatcher
 
 # Set up OpenAI (optional)
 os.environ["OPENAI_API_KEY"] = os.getenv("GOOGLE_API_KEY")
 
+# Keyword tables compiled into one automaton; earlier groups win, like the if/elif chain they replace
+KEYWORDS = (KeywordMatcher()
+            .add_groups("category", [
+                (("authentication", "medium"), ["password", "login", "access"]),
+                (("billing", "high"), ["billing", "payment", "invoice"]),
+                (("technical", "high"), ["bug", "error", "crash", "broken"]),
+                (("complaint", "urgent"), ["angry", "frustrated", "terrible"])
+            ])
+            .add_groups("human", [(True, ["manager", "supervisor", "human"])]))
+
 # Define workflow state - this persists across all nodes
 class SupportWorkflowState(TypedDict):
     """State that flows through the support workflow"""
@@ -52,24 +66,8 @@ def categorize_request(state: SupportWorkflowState) -> SupportWorkflowState:
     """Categorize the support request"""
     print(f"📂 Categorizing request {state['request_id']}")
     
-    message = state["user_message"].lower()
-    
     # Simple categorization logic
-    if any(word in message for word in ["password", "login", "access"]):
-        state["category"] = "authentication"
-        state["priority"] = "medium"
-    elif any(word in message for word in ["billing", "payment", "invoice"]):
-        state["category"] = "billing"
-        state["priority"] = "high"
-    elif any(word in message for word in ["bug", "error", "crash", "broken"]):
-        state["category"] = "technical"
-        state["priority"] = "high"
-    elif any(word in message for word in ["angry", "frustrated", "terrible"]):
-        state["category"] = "complaint"
-        state["priority"] = "urgent"
-    else:
-        state["category"] = "general"
-        state["priority"] = "low"
+    state["category"], state["priority"] = KEYWORDS.scan(state["user_message"]).best("category") or ("general", "low")
     
     state["step_count"] = state.get("step_count", 0) + 1
     print(f"✅ Categorized as: {state['category']} (Priority: {state['priority']})")
@@ -103,7 +101,7 @@ def check_escalation_needed(state: SupportWorkflowState) -> SupportWorkflowState
     escalation_needed = (
         state["priority"] in ["urgent", "high"] or
         state["category"] in ["complaint", "technical"] or
-        any(word in state["user_message"].lower() for word in ["manager", "supervisor", "human"])
+        KEYWORDS.scan(state["user_message"]).any("human")
     )
     
     state["escalated"] = escalation_needed
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Serialization Benchmark: FastAPI's default response path vs FastJSONResponse
+"""
+
+import os
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from production_api import ChatResponse, HealthResponse, FastJSONResponse, agent
+from common import fast_json
+
+def default_path(model_class, content):
+    # What FastAPI does for a route with response_model: validate the return value, encode, json.dumps
+    validated = model_class.model_validate(content) if model_class else content
+    return JSONResponse(jsonable_encoder(validated)).body
+
+def fast_path(content):
+    return FastJSONResponse(content).body
+
+def per_request_us(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+def main():
+    payloads = [
+        ("ChatResponse", ChatResponse, ChatResponse(
+            response="To reset your password, click 'Forgot Password' on the login page.",
+            session_id="session_8cff5a558ae74d819a7799e94c441219",
+            escalated=False,
+            confidence=0.95,
+            processing_time_ms=3
+        ), 50000),
+        ("HealthResponse", HealthResponse, HealthResponse(
+            status="healthy", timestamp=datetime.now(), uptime_seconds=123.4, version="1.0.0"
+        ), 50000),
+        ("/metrics", None, agent.get_metrics(), 2000)
+    ]
+    
+    print("=== Serialization cost per response ===")
+    print(f"JSON backend: {'orjson' if fast_json.orjson else 'json (install orjson for the fast path)'}\n")
+    print(f"{'payload':<16}{'default (us)':>14}{'fast (us)':>12}{'speedup':>10}")
+    
+    for name, model_class, content, number in payloads:
+        default_us = per_request_us(lambda: default_path(model_class, content), number)
+        fast_us = per_request_us(lambda: fast_path(content), number)
+        print(f"{name:<16}{default_us:>14.2f}{fast_us:>12.2f}{default_us / fast_us:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -3,30 +3,65 @@
 FastAPI Production Agent API with Google Gemini
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional
-import requests
+from typing import AsyncIterator, Optional, Sequence
+from contextlib import ExitStack, asynccontextmanager, nullcontext
 import time
+import asyncio
 import logging
 from datetime import datetime
 import os
+import sys
+import signal
+import threading
 from dotenv import load_dotenv
 
-load_dotenv()quit
+# Before the common imports: they read their settings from the environment when imported
+load_dotenv()
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.gemini_client import UPSTREAM_LATENCY, get_client, aclose_clients
+from common.response_cache import ResponseCache
+from common.semantic_cache import SemanticCache
+from common.session_store import SessionStore
+from common.single_flight import SingleFlight
+from common.rate_limit import QUEUE_WAIT, get_rate_limiter
+from common.circuit_breaker import OPEN, CircuitOpenError, get_circuit_breaker
+from common.keyword_matcher import KeywordHits, KeywordMatcher
+from common.faq_index import HybridFAQIndex
+from common.metrics import get_registry
+from common.admission import AdmissionController, OverloadedError
+from common.scheduler import PriorityScheduler
+from common.user_limits import RateLimitedError, RequestLimits
+from common.loop_monitor import LoopLagMonitor
+from common.health import CachedProbe
+from common import fast_json
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 GEMINI_MODEL = "gemini-2.0-flash"
-GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+FAQ_PATH = os.getenv("FAQ_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "faq.json"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+WS_MAX_IN_FLIGHT = int(os.getenv("WS_MAX_IN_FLIGHT", "4"))
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))
+DRAIN_TIMEOUT_SECONDS = float(os.getenv("DRAIN_TIMEOUT_SECONDS", "20"))
+HEALTH_MAX_LOOP_LAG_SECONDS = float(os.getenv("HEALTH_MAX_LOOP_LAG_SECONDS", "0.5"))
+HEALTH_MAX_IN_FLIGHT = int(os.getenv("HEALTH_MAX_IN_FLIGHT", "500"))
+HEALTH_MAX_QUEUE_DEPTH = int(os.getenv("HEALTH_MAX_QUEUE_DEPTH", "100"))
+HEALTH_REQUIRE_UPSTREAM = os.getenv("HEALTH_REQUIRE_UPSTREAM", "0") == "1"
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".snapshot"))
 
 class ChatRequest(BaseModel):
     message: str = Field(..., min_length=1, max_length=1000)
     user_id: str
-    session_id: Optional[str] = None
+    session_id: Optional[str] = Field(None, max_length=128)
 
 class ChatResponse(BaseModel):
     response: str
@@ -35,135 +70,604 @@ class ChatResponse(BaseModel):
     confidence: float
     processing_time_ms: int
 
+class BatchChatRequest(BaseModel):
+    requests: list[ChatRequest] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+
+class BatchItemResult(BaseModel):
+    index: int
+    response: Optional[ChatResponse] = None
+    error: Optional[str] = None
+
+class BatchChatResponse(BaseModel):
+    results: list[BatchItemResult]
+    succeeded: int
+    failed: int
+    processing_time_ms: int
+
 class HealthResponse(BaseModel):
     status: str
     timestamp: datetime
     uptime_seconds: float
     version: str
+    checks: Optional[dict] = None
 
 class ProductionAgent:
-    def __init__(self, api_key: str, use_llm: bool = True):
+    def __init__(self, api_key: str, use_llm: bool = True, faq_path: str = FAQ_PATH):
         self.api_key = api_key
         self.use_llm = use_llm
         self.start_time = time.time()
+        self.ready = False
+        self.draining = False
+        self.in_flight = 0
         
         if use_llm:
-            self.api_url = f"{GEMINI_API_URL}?key={api_key}"
-        
-        self.faq = {
-            "password": "To reset your password, click 'Forgot Password' on the login page.",
-            "billing": "For billing questions, contact billing@company.com.",
-            "shipping": "Standard shipping takes 3-5 business days.",
-            "return": "You can return items within 30 days. Go to Orders > Return Item.",
-            "cancel": "To cancel your order, go to Orders and click 'Cancel'."
-        }
+            self.client = get_client(api_key, GEMINI_MODEL)
+        
+        self.cache = ResponseCache()
+        self.semantic_cache = SemanticCache()
+        self.sessions = SessionStore()
+        self.single_flight = SingleFlight()
+        self.limits = RequestLimits()
+        self.admission = AdmissionController()
+        self.scheduler = PriorityScheduler()
+        self.loop_monitor = LoopLagMonitor()
+        if use_llm:
+            self.upstream = CachedProbe("Gemini", self.client.aprobe)
+        
+        self.faq = HybridFAQIndex.from_file(faq_path)
         
         self.escalation_keywords = ["angry", "frustrated", "complaint", "terrible", "manager"]
         
+        self.fallback_responses = [
+            ("Track your order in 'My Orders'. Standard shipping takes 3-5 business days.", ["ship", "delivery", "track"]),
+            ("Refunds are processed within 5-7 business days after we receive the return.", ["refund", "money back"])
+        ]
+        
+        # One automaton over every keyword table, so a message is scanned once however long the tables grow
+        self.keywords = (KeywordMatcher()
+                         .add_groups("escalation", [(True, self.escalation_keywords)])
+                         .add_groups("fallback", self.fallback_responses)
+                         .add_groups("urgent", [(True, ["urgent", "asap", "critical"])])
+                         .add_groups("category", [
+                             ("authentication", ["password", "login", "auth"]),
+                             ("billing", ["bill", "payment", "charge"]),
+                             ("technical", ["bug", "error", "broken"])
+                         ]))
+        
+        registry = get_registry()
         self.metrics = {
-            "total_requests": 0,
-            "successful_responses": 0,
-            "escalations": 0,
-            "errors": 0
+            "total_requests": registry.counter("agent_requests_total", "Chat messages received"),
+            "successful_responses": registry.counter("agent_successful_responses_total", "Chat messages answered"),
+            "escalations": registry.counter("agent_escalations_total", "Messages handed to a human agent"),
+            "errors": registry.counter("agent_errors_total", "Messages that failed with an error")
+        }
+        
+        # Per-path histograms: a FAQ hit and a Gemini round trip differ by three orders of magnitude
+        self.latency = registry.histogram("agent_request_seconds", "End-to-end time to answer a chat message")
+        self.path_latency = {
+            path: registry.histogram("agent_path_seconds", "Time to answer a chat message, by answer path", path=path)
+            for path in ("faq", "escalation", "llm", "fallback", "partial")
         }
     
     async def process_message(self, request: ChatRequest) -> ChatResponse:
         start_time = time.time()
         
         try:
-            self.metrics["total_requests"] += 1
-            
-            message_lower = request.message.lower()
-            
-            escalated = any(keyword in message_lower for keyword in self.escalation_keywords)
-            
-            if escalated:
-                response_text = "I understand your frustration. Let me connect you with a human agent."
-                confidence = 0.9
-                self.metrics["escalations"] += 1
-            else:
-                response_text = None
-                confidence = 0.3
-                
-                for keyword, answer in self.faq.items():
-                    if keyword in message_lower:
-                        response_text = answer
-                        confidence = 0.95
-                        break
-                
-                if not response_text and self.use_llm:
-                    try:
-                        response_text = await self._get_llm_response(request.message)
-                        confidence = 0.85
-                    except Exception as e:
-                        logger.error(f"LLM error: {e}")
-                        response_text = self._get_fallback_response(message_lower)
-                        confidence = 0.6
-                
-                if not response_text:
-                    response_text = self._get_fallback_response(message_lower)
-                    confidence = 0.6
-            
-            self.metrics["successful_responses"] += 1
-            
-            processing_time = int((time.time() - start_time) * 1000)
-            
-            return ChatResponse(
-                response=response_text,
-                session_id=request.session_id or f"session_{int(time.time())}",
-                escalated=escalated,
-                confidence=confidence,
-                processing_time_ms=processing_time
-            )
+            # Before anything else, so a client over its limit costs a dict lookup, not matching or a Gemini call
+            await self.limits.check(request.user_id, request.session_id)
+            self.metrics["total_requests"].inc()
             
+            hits, local = self._match_local([request.message])[0]
+            return await self._respond(request, hits, local, start_time)
+        
+        except OverloadedError as e:
+            raise overloaded(e)
         except Exception as e:
-            self.metrics["errors"] += 1
+            self.metrics["errors"].inc()
             logger.error(f"Error processing message: {e}")
             raise HTTPException(status_code=500, detail=str(e))
     
-    async def _get_llm_response(self, message: str) -> str:
-        prompt = f"You are a helpful customer support agent. Customer says: '{message}'. Provide a brief, helpful response (1-2 sentences)."
+    async def process_batch(self, requests: list[ChatRequest]) -> BatchChatResponse:
+        """Local matching over the whole batch at once, then LLM-bound items concurrently under a cap"""
+        start_time = time.time()
         
-        payload = {
-            "contents": [{"parts": [{"text": prompt}]}],
-            "generationConfig": {"temperature": 0.7, "maxOutputTokens": 150}
-        }
+        # Every item counts against its own user and session limits
+        limited: dict[int, str] = {}
+        for index, request in enumerate(requests):
+            try:
+                await self.limits.check(request.user_id, request.session_id)
+            except RateLimitedError as e:
+                limited[index] = str(e)
         
-        response = requests.post(self.api_url, headers={"Content-Type": "application/json"}, json=payload, timeout=30)
-        response.raise_for_status()
+        allowed = [index for index in range(len(requests)) if index not in limited]
+        self.metrics["total_requests"].inc(len(allowed))
+        matched = dict(zip(allowed, self._match_local([requests[index].message for index in allowed])))
+        llm_slots = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
         
-        result = response.json()
-        parts = result["candidates"][0].get("content", {}).get("parts", [])
-        if parts:
-            return parts[0].get("text", "").strip()
+        async def run(index: int, request: ChatRequest) -> BatchItemResult:
+            if index in limited:
+                return BatchItemResult(index=index, error=limited[index])
+            try:
+                hits, local = matched[index]
+                response = await self._respond(request, hits, local, time.time(), llm_slots)
+                return BatchItemResult(index=index, response=response)
+            except Exception as e:
+                # One bad item is reported in place instead of failing the whole batch
+                self.metrics["errors"].inc()
+                logger.error(f"Error processing batch item {index}: {e}")
+                return BatchItemResult(index=index, error=str(e))
         
-        raise RuntimeError("Invalid response")
+        results = await asyncio.gather(*(run(index, request) for index, request in enumerate(requests)))
+        failed = sum(1 for result in results if result.error is not None)
+        
+        return BatchChatResponse(
+            results=results,
+            succeeded=len(results) - failed,
+            failed=failed,
+            processing_time_ms=int((time.time() - start_time) * 1000)
+        )
     
-    def _get_fallback_response(self, message_lower: str) -> str:
-        if any(word in message_lower for word in ["ship", "delivery", "track"]):
-            return "Track your order in 'My Orders'. Standard shipping takes 3-5 business days."
+    async def _respond(self, request: ChatRequest, hits: KeywordHits, local: tuple[Optional[str], float, bool],
+                       start_time: float, llm_slots: Optional[asyncio.Semaphore] = None) -> ChatResponse:
+        response_text, confidence, escalated = local
+        path = "escalation" if escalated else "faq"
+        session_id = request.session_id or self.sessions.new_id()
+        
+        if escalated:
+            self.metrics["escalations"].inc()
+        
+        if not response_text and self.use_llm:
+            try:
+                history = self.sessions.history(request.user_id, session_id) if request.session_id else []
+                async with llm_slots or nullcontext():
+                    response_text = await self._get_llm_response(request.message, self._priority(hits), request.user_id,
+                                                                 history)
+                confidence = 0.85
+                path = "llm"
+            except OverloadedError:
+                raise
+            except Exception as e:
+                logger.error(f"LLM error: {e}")
+                response_text = self._get_fallback_response(hits)
+                confidence = 0.6
+                path = "fallback"
+        
+        if not response_text:
+            response_text = self._get_fallback_response(hits)
+            confidence = 0.6
+            path = "fallback"
         
-        if any(word in message_lower for word in ["refund", "money back"]):
-            return "Refunds are processed within 5-7 business days after we receive the return."
+        self.metrics["successful_responses"].inc()
+        self._record_latency(path, start_time)
+        self.sessions.append(request.user_id, session_id, request.message, response_text)
         
-        return "I can help with passwords, billing, returns, and shipping. What do you need?"
+        processing_time = int((time.time() - start_time) * 1000)
+        
+        return ChatResponse(
+            response=response_text,
+            session_id=session_id,
+            escalated=escalated,
+            confidence=confidence,
+            processing_time_ms=processing_time
+        )
+    
+    async def stream_message(self, request: ChatRequest) -> AsyncIterator[dict]:
+        """Yield {"text": ...} chunks as they arrive, then a final {"done": ...} event"""
+        start_time = time.time()
+        await self.limits.check(request.user_id, request.session_id)
+        self.metrics["total_requests"].inc()
+        
+        hits, (response_text, confidence, escalated) = self._match_local([request.message])[0]
+        path = "escalation" if escalated else "faq"
+        
+        if escalated:
+            self.metrics["escalations"].inc()
+        
+        session_id = request.session_id or self.sessions.new_id()
+        partial = False
+        
+        if response_text:
+            yield {"text": response_text}
+        elif self.use_llm:
+            path = "llm"
+            history = self.sessions.history(request.user_id, session_id) if request.session_id else []
+            prompt = self._build_prompt(request.message, history)
+            cache_key, cached = await self._lookup_cache(request.message, prompt, history)
+            # During an incident, fall back at once instead of taking an admission slot and queueing behind hung calls
+            circuit_open = cached is None and self.client.breaker.rejecting()
+            streamed = False
+            with ExitStack() as admission:
+                if cached is None and not circuit_open:
+                    # Admission runs before the first event, so a shed stream still gets a 429/503 status
+                    admission.enter_context(self.admission.llm_slot())
+                try:
+                    if circuit_open:
+                        raise CircuitOpenError("Gemini circuit is open")
+                    if cached is not None:
+                        response_text = cached
+                        yield {"text": cached}
+                    else:
+                        chunks = []
+                        buffer: asyncio.Queue = asyncio.Queue()
+                        reader = asyncio.create_task(
+                            self._read_upstream(prompt, self._priority(hits), request.user_id, buffer)
+                        )
+                        # The reader owns the admission slot from here, so a slow client never holds it
+                        reader.add_done_callback(lambda _, slot=admission.pop_all(): slot.close())
+                        try:
+                            while (chunk := await buffer.get()) is not None:
+                                if isinstance(chunk, Exception):
+                                    raise chunk
+                                streamed = True
+                                chunks.append(chunk)
+                                yield {"text": chunk}
+                        finally:
+                            reader.cancel()  # no-op once upstream is done; stops Gemini if the client left
+                        response_text = "".join(chunks).strip()
+                        if not response_text:
+                            # A blocked or empty candidate; agenerate() raises the same way
+                            raise RuntimeError("Invalid response")
+                        self._store_cache(request.message, cache_key, response_text, history)
+                    confidence = 0.85
+                except Exception as e:
+                    logger.error(f"LLM stream error: {e}")
+                    if streamed:
+                        # The client already has the truncated text; flag it rather than pass it off as an answer
+                        partial = True
+                        confidence = 0.0
+                        path = "partial"
+                    else:
+                        response_text = self._get_fallback_response(hits)
+                        yield {"text": response_text}
+                        confidence = 0.6
+                        path = "fallback"
+        else:
+            response_text = self._get_fallback_response(hits)
+            yield {"text": response_text}
+            confidence = 0.6
+            path = "fallback"
+        
+        self._record_latency(path, start_time)
+        if partial:
+            # A cut-off reply would become context for the next turn, so it is never stored
+            self.metrics["errors"].inc()
+        else:
+            self.metrics["successful_responses"].inc()
+            self.sessions.append(request.user_id, session_id, request.message, response_text)
+        
+        yield {"done": {
+            "session_id": session_id,
+            "escalated": escalated,
+            "confidence": confidence,
+            "partial": partial,
+            "processing_time_ms": int((time.time() - start_time) * 1000)
+        }}
+    
+    async def _read_upstream(self, prompt: str, priority: str, user_id: str, buffer: asyncio.Queue):
+        """Drain Gemini into `buffer` at upstream speed, ending with None or the error that stopped the stream"""
+        try:
+            async with self.scheduler.slot(priority, user_id):
+                async for chunk in self.client.astream(prompt):
+                    buffer.put_nowait(chunk)
+        except Exception as e:
+            buffer.put_nowait(e)
+        else:
+            buffer.put_nowait(None)
+    
+    def _record_latency(self, path: str, start_time: float):
+        elapsed = time.time() - start_time
+        self.latency.observe(elapsed)
+        self.path_latency[path].observe(elapsed)
+    
+    def _match_local(self, messages: list[str]) -> list[tuple[KeywordHits, tuple[Optional[str], float, bool]]]:
+        """Keyword scan, escalation and FAQ checks; returns (hits, (response_text, confidence, escalated)) per message"""
+        hits = [self.keywords.scan(message) for message in messages]
+        
+        # Escalations never reach the FAQ; everything else goes through one batched FAQ lookup
+        pending = [i for i, message_hits in enumerate(hits) if not message_hits.any("escalation")]
+        faq_matches = dict(zip(pending, self.faq.lookup_batch([messages[i] for i in pending])))
+        
+        results = []
+        for i, message_hits in enumerate(hits):
+            match = faq_matches.get(i)
+            if message_hits.any("escalation"):
+                local = ("I understand your frustration. Let me connect you with a human agent.", 0.9, True)
+            elif match:
+                local = (match.answer, round(0.95 * match.confidence, 2), False)
+            else:
+                local = (None, 0.3, False)
+            results.append((message_hits, local))
+        
+        return results
+    
+    def _build_prompt(self, message: str, history: Sequence[tuple[str, str]] = ()) -> str:
+        if not history:
+            return f"You are a helpful customer support agent. Customer says: '{message}'. Provide a brief, helpful response (1-2 sentences)."
+        
+        conversation = "\n".join(f"Customer: {said}\nAgent: {replied}" for said, replied in history)
+        return f"You are a helpful customer support agent. Conversation so far:\n{conversation}\nCustomer now says: '{message}'. Provide a brief, helpful response (1-2 sentences)."
+    
+    async def _lookup_cache(self, message: str, prompt: str,
+                            history: Sequence[tuple[str, str]] = ()) -> tuple[str, Optional[str]]:
+        """Exact-match cache first, then the semantic cache for paraphrases"""
+        cache_key = self.cache.make_key(prompt, GEMINI_MODEL)
+        cached = await self.cache.aget(cache_key)
+        # The semantic cache only sees the message, so it cannot answer a question that depends on earlier turns
+        if cached is None and not history:
+            cached = self.semantic_cache.get(message)
+        return cache_key, cached
+    
+    def _store_cache(self, message: str, cache_key: str, response_text: str, history: Sequence[tuple[str, str]] = ()):
+        self.cache.set(cache_key, response_text)
+        if not history:
+            self.semantic_cache.add(message, response_text)
+    
+    def _priority(self, hits: KeywordHits) -> str:
+        """Scheduling class, following the priority rules of the task4 workflows"""
+        if hits.any("urgent") or hits.any("escalation"):
+            return "high"
+        if hits.best("category") in ("billing", "technical"):
+            return "medium"
+        return "low"
+    
+    async def _get_llm_response(self, message: str, priority: str = "low", user_id: str = "",
+                                history: Sequence[tuple[str, str]] = ()) -> str:
+        prompt = self._build_prompt(message, history)
+        
+        cache_key, cached = await self._lookup_cache(message, prompt, history)
+        if cached is not None:
+            return cached
+        # Checked before admission and the scheduler, so an open circuit falls back at once
+        if self.client.breaker.rejecting():
+            raise CircuitOpenError("Gemini circuit is open")
+        
+        async def fetch() -> str:
+            # Only the call that actually reaches Gemini queues for a slot, not the callers coalesced onto it
+            async with self.scheduler.slot(priority, user_id):
+                response_text = await self.client.agenerate(prompt, timeout=LLM_TIMEOUT_SECONDS)
+            self._store_cache(message, cache_key, response_text, history)
+            return response_text
+        
+        # Cache hits are cheap and never shed; only requests that would wait on Gemini are
+        with self.admission.llm_slot():
+            # Identical prompts arriving together (e.g. during an outage) share one Gemini call
+            return await self.single_flight.do(cache_key, fetch)
+    
+    def _get_fallback_response(self, hits: KeywordHits) -> str:
+        return hits.best("fallback") or "I can help with passwords, billing, returns, and shipping. What do you need?"
+    
+    async def warm_up(self, snapshot_dir: str = SNAPSHOT_DIR):
+        """Reload cache snapshots, build lazy indexes and open upstream connections; /health turns healthy after"""
+        started = time.time()
+        if snapshot_dir:
+            self._load_snapshot(snapshot_dir)
+        
+        self.keywords.build()
+        self._match_local(["warm up"])  # runs every matcher once and pages the mmap'd FAQ vectors in
+        
+        self.loop_monitor.start()
+        if self.use_llm:
+            if not await self.upstream.refresh():
+                logger.warning("⚠️ Gemini probe failed during warm-up; LLM calls will connect on demand")
+            self.upstream.start()
+        
+        self.ready = True
+        logger.info(f"✅ Warm-up finished in {time.time() - started:.2f}s")
+    
+    async def drain(self, timeout: float = DRAIN_TIMEOUT_SECONDS):
+        """Refuse new requests, then wait up to `timeout` for in-flight ones and their Gemini calls to finish"""
+        self.draining = True
+        deadline = time.monotonic() + timeout
+        while self.in_flight or self.single_flight.stats()["in_flight"]:
+            if time.monotonic() >= deadline:
+                logger.warning(f"⚠️ Drain deadline reached with {self.in_flight} requests in flight")
+                return
+            await asyncio.sleep(0.05)
+    
+    def _load_snapshot(self, directory: str):
+        for name, cache in (("response_cache.json", self.cache), ("semantic_cache.npz", self.semantic_cache)):
+            path = os.path.join(directory, name)
+            if not os.path.exists(path):
+                continue
+            try:
+                logger.info(f"Restored {cache.load(path)} entries from {path}")
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"⚠️ Ignoring unreadable snapshot {path}: {e}")
+    
+    def save_snapshot(self, directory: str = SNAPSHOT_DIR):
+        """
+        Persist both caches for the next start, plus the final metrics for the record. Metrics are not
+        restored: counters restarting at zero is what Prometheus rate() expects from a new process.
+        With several workers the last one to exit wins, which is fine for a cache.
+        """
+        if not directory:
+            return
+        try:
+            os.makedirs(directory, exist_ok=True)
+            saved = self.cache.save(os.path.join(directory, "response_cache.json"))
+            saved += self.semantic_cache.save(os.path.join(directory, "semantic_cache.npz"))
+            with open(os.path.join(directory, "metrics.json"), "wb") as f:
+                f.write(fast_json.dumps({"saved_at": datetime.now(), **self.get_metrics()}))
+            logger.info(f"💾 Saved {saved} cache entries to {directory}")
+        except OSError as e:
+            logger.warning(f"⚠️ Could not write snapshot to {directory}: {e}")
+    
+    def stop_background(self):
+        self.loop_monitor.stop()
+        if self.use_llm:
+            self.upstream.stop()
+    
+    def get_readiness(self) -> dict:
+        """Readiness checks from state already at hand: sampled loop lag, counters and the cached upstream probe"""
+        lag = self.loop_monitor.current_lag()
+        checks = {
+            "event_loop_lag": {"ok": lag <= HEALTH_MAX_LOOP_LAG_SECONDS, "value_ms": round(lag * 1000, 1),
+                               "limit_ms": HEALTH_MAX_LOOP_LAG_SECONDS * 1000},
+            "in_flight": {"ok": self.in_flight <= HEALTH_MAX_IN_FLIGHT, "value": self.in_flight,
+                          "limit": HEALTH_MAX_IN_FLIGHT},
+            "queue_depth": {"ok": self.scheduler.queue_depth <= HEALTH_MAX_QUEUE_DEPTH,
+                            "value": self.scheduler.queue_depth, "limit": HEALTH_MAX_QUEUE_DEPTH}
+        }
+        
+        if self.use_llm:
+            # An open breaker already knows Gemini is failing from real traffic; no probe needed for that
+            breaker = get_circuit_breaker().state
+            up = bool(self.upstream.ok) and breaker != OPEN
+            checks["upstream"] = {"ok": up or not HEALTH_REQUIRE_UPSTREAM, "up": up, "circuit_breaker": breaker,
+                                  "probe": self.upstream.stats()}
+        
+        return checks
     
     def get_health(self) -> HealthResponse:
+        checks = self.get_readiness()
+        if self.draining:
+            status = "draining"
+        elif not self.ready:
+            status = "starting"
+        else:
+            status = "healthy" if all(check["ok"] for check in checks.values()) else "degraded"
+        
         return HealthResponse(
-            status="healthy",
+            status=status,
             timestamp=datetime.now(),
             uptime_seconds=time.time() - self.start_time,
-            version="1.0.0"
+            version="1.0.0",
+            checks=checks
         )
     
     def get_metrics(self) -> dict:
-        return {
-            **self.metrics,
+        counters = {name: counter.value for name, counter in self.metrics.items()}
+        metrics = {
+            **counters,
+            # Counters and latency are fleet-wide when METRICS_MULTIPROC_DIR is set; the rest is this worker's
+            "workers": get_registry().store.workers(),
+            "event_loop": self.loop_monitor.stats(),
             "uptime_seconds": time.time() - self.start_time,
-            "success_rate": self.metrics["successful_responses"] / max(self.metrics["total_requests"], 1)
+            "success_rate": counters["successful_responses"] / max(counters["total_requests"], 1),
+            "latency": {
+                "total": self.latency.summary(),
+                **{path: histogram.summary() for path, histogram in self.path_latency.items()},
+                "gemini_upstream": UPSTREAM_LATENCY.summary(),
+                "gemini_queue_wait": QUEUE_WAIT.summary()
+            },
+            "cache": self.cache.stats(),
+            "semantic_cache": self.semantic_cache.stats(),
+            "sessions": self.sessions.stats(),
+            "single_flight": self.single_flight.stats(),
+            "rate_limits": self.limits.stats(),
+            "admission": self.admission.stats(),
+            "scheduler": self.scheduler.stats(),
+            "rate_limiter": get_rate_limiter().stats(),
+            "circuit_breaker": get_circuit_breaker().stats()
         }
+        
+        if self.use_llm:
+            metrics["retry"] = self.client.retry.stats()
+        
+        return metrics
+
+class FastJSONResponse(JSONResponse):
+    """
+    Renders models and dicts with orjson when available. Routes return it directly, which also
+    skips FastAPI's response_model re-validation and jsonable_encoder pass; response_model stays
+    on the route for the OpenAPI schema only.
+    """
+    
+    def render(self, content) -> bytes:
+        return fast_json.dumps(content)
+
+def overloaded(error: OverloadedError) -> HTTPException:
+    return HTTPException(status_code=error.status_code, detail=str(error),
+                         headers={"Retry-After": str(error.retry_after)})
+
+class InFlightMiddleware:
+    """
+    Counts HTTP requests until their response finishes (streams included) so shutdown can drain them, and
+    turns new requests and sockets away once draining starts. Plain ASGI, so streaming bodies are not buffered.
+    An open websocket is not work in flight; ws_chat counts its messages instead.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket") or scope["path"].startswith("/health"):
+            return await self.app(scope, receive, send)
+        
+        if agent.draining:
+            if scope["type"] == "websocket":
+                await receive()  # websocket.connect
+                return await send({"type": "websocket.close", "code": 1012})  # service restart
+            response = FastJSONResponse({"detail": "Server is shutting down"}, status_code=503,
+                                        headers={"Retry-After": "1"})
+            return await response(scope, receive, send)
+        
+        if scope["type"] == "websocket":
+            return await self.app(scope, receive, send)
+        
+        agent.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            agent.in_flight -= 1
 
-app = FastAPI(title="Production Support Agent API", version="1.0.0")
+def install_drain_on_signal():
+    """
+    Uvicorn closes its listening sockets and finishes (or cancels) open requests before it sends the
+    lifespan shutdown event, which is too late to turn anything away. So chain in front of the server's
+    SIGTERM/SIGINT handler: start draining at once, and pass the signal on once drained or at the deadline.
+    A second signal goes straight through. Runs from lifespan startup, after uvicorn installed its handlers.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return  # signals only reach the main thread; e.g. under TestClient there is nothing to chain
+    
+    loop = asyncio.get_running_loop()
+    
+    async def drain_then_exit(handler, signum: int):
+        await agent.drain()
+        handler(signum, None)
+    
+    def start_drain(handler, signum: int):
+        task = loop.create_task(drain_then_exit(handler, signum))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+    
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        server_handler = signal.getsignal(sig)
+        if not callable(server_handler):
+            continue
+        if getattr(server_handler, "__name__", "") == "_sighandler_noop":
+            # uvicorn < 0.29 registers through loop.add_signal_handler(): the loop's wakeup fd reaches the
+            # server whatever handler sits here, so there is nothing to chain in front of
+            logger.warning(f"⚠️ {signal.Signals(sig).name} is handled by the event loop (uvicorn < 0.29); "
+                           "shutdown will not drain in-flight requests")
+            continue
+        
+        def handler(signum, frame, server_handler=server_handler):
+            if agent.draining:
+                return server_handler(signum, frame)
+            agent.draining = True
+            logger.info(f"🛑 Draining for up to {DRAIN_TIMEOUT_SECONDS:.0f}s before shutdown")
+            loop.call_soon_threadsafe(start_drain, server_handler, signum)
+        
+        signal.signal(sig, handler)
+
+background_tasks: set[asyncio.Task] = set()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    install_drain_on_signal()
+    # Warm up in the background: the server accepts connections at once and /health says "starting" until done
+    warm_up = asyncio.create_task(agent.warm_up())
+    yield
+    warm_up.cancel()
+    agent.stop_background()
+    await agent.drain()  # normally already drained on the signal; catches Gemini calls detached by single-flight
+    agent.save_snapshot()
+    await aclose_clients()
+    agent.cache.close()
+
+app = FastAPI(title="Production Support Agent API", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -172,21 +676,143 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(InFlightMiddleware)
 
 agent = ProductionAgent(GOOGLE_API_KEY, use_llm=True)
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     logger.info(f"Chat request from user {request.user_id}: {request.message[:50]}...")
-    return await agent.process_message(request)
+    return FastJSONResponse(await agent.process_message(request))
+
+@app.post("/chat/batch", response_model=BatchChatResponse)
+async def chat_batch(batch: BatchChatRequest):
+    logger.info(f"Batch request with {len(batch.requests)} messages")
+    return FastJSONResponse(await agent.process_batch(batch.requests))
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    logger.info(f"Stream request from user {request.user_id}: {request.message[:50]}...")
+    
+    stream = agent.stream_message(request)
+    try:
+        first = await stream.__anext__()
+    except OverloadedError as e:
+        raise overloaded(e)
+    
+    def encode(event: dict) -> str:
+        if "done" in event:
+            return f"event: done\ndata: {fast_json.dumps(event['done']).decode()}\n\n"
+        return f"data: {fast_json.dumps(event).decode()}\n\n"
+    
+    async def events():
+        yield encode(first)
+        async for event in stream:
+            yield encode(event)
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.websocket("/ws/chat")
+async def ws_chat(websocket: WebSocket, user_id: str, session_id: Optional[str] = None):
+    """
+    One connection per session. Client frames: {"id", "message"} or {"id", "type": "cancel"}.
+    Server frames: ready, then chunk / done / error frames tagged with the message id they answer.
+    """
+    await websocket.accept()
+    session_id = session_id or agent.sessions.new_id()
+    # Bounded: when the client reads slowly the writer blocks, the queue fills and answers
+    # stop pulling chunks from Gemini until there is room again
+    outbox: asyncio.Queue = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+    tasks: dict[str, asyncio.Task] = {}
+    
+    async def writer():
+        while True:
+            await websocket.send_text(fast_json.dumps(await outbox.get()).decode())
+    
+    async def answer(message_id: str, message: str):
+        # Validated by hand below; skips re-running pydantic for every frame on an open socket
+        request = ChatRequest.model_construct(message=message, user_id=user_id, session_id=session_id)
+        agent.in_flight += 1
+        try:
+            async for event in agent.stream_message(request):
+                if "done" in event:
+                    await outbox.put({"id": message_id, "type": "done", **event["done"]})
+                else:
+                    await outbox.put({"id": message_id, "type": "chunk", **event})
+        except OverloadedError as e:
+            await outbox.put({"id": message_id, "type": "error", "status": e.status_code, "detail": str(e),
+                              "retry_after": e.retry_after})
+        except Exception as e:
+            agent.metrics["errors"].inc()
+            logger.error(f"WebSocket message error: {e}")
+            await outbox.put({"id": message_id, "type": "error", "status": 500, "detail": str(e)})
+        finally:
+            agent.in_flight -= 1
+            # A cancel frame already dropped this task, and the client may have reused the id since
+            if tasks.get(message_id) is asyncio.current_task():
+                del tasks[message_id]
+    
+    logger.info(f"WebSocket connected for user {user_id}, {session_id}")
+    await outbox.put({"type": "ready", "session_id": session_id})
+    writer_task = asyncio.create_task(writer())
+    
+    try:
+        while True:
+            try:
+                frame = fast_json.loads(await websocket.receive_text())
+                if not isinstance(frame, dict):
+                    raise ValueError(frame)
+            except ValueError:
+                await outbox.put({"type": "error", "status": 400, "detail": "Frames must be JSON objects"})
+                continue
+            
+            message_id = str(frame.get("id", ""))
+            if frame.get("type") == "cancel":
+                task = tasks.pop(message_id, None)
+                if task:
+                    task.cancel()
+                continue
+            
+            message = frame.get("message")
+            if not message_id or message_id in tasks:
+                error = (400, "Each message needs an id that is not already in flight")
+            elif not isinstance(message, str) or not 1 <= len(message) <= 1000:
+                error = (422, "message must be 1-1000 characters")
+            elif len(tasks) >= WS_MAX_IN_FLIGHT:
+                error = (429, "Too many messages in flight on this connection")
+            elif agent.draining:
+                error = (503, "Server is shutting down")
+            else:
+                tasks[message_id] = asyncio.create_task(answer(message_id, message))
+                continue
+            await outbox.put({"id": message_id, "type": "error", "status": error[0], "detail": error[1]})
+    except WebSocketDisconnect:
+        logger.info(f"WebSocket closed for {session_id}")
+    finally:
+        for task in tasks.values():
+            task.cancel()
+        writer_task.cancel()
+
+@app.get("/health/live", response_model=HealthResponse)
+async def health_live():
+    """Liveness: answering at all means the process and its event loop are alive; no dependency is checked"""
+    return FastJSONResponse(HealthResponse(status="alive", timestamp=datetime.now(),
+                                           uptime_seconds=time.time() - agent.start_time, version="1.0.0"))
 
 @app.get("/health", response_model=HealthResponse)
-async def health():
-    return agent.get_health()
+@app.get("/health/ready", response_model=HealthResponse)
+async def health_ready():
+    """Readiness: 503 while starting, draining or degraded, so the load balancer routes around this worker"""
+    health = agent.get_health()
+    return FastJSONResponse(health, status_code=200 if health.status == "healthy" else 503)
 
 @app.get("/metrics")
-async def metrics():
-    return agent.get_metrics()
+async def metrics(request: Request, format: Optional[str] = None):
+    """JSON by default; Prometheus text for scrapers (Accept: text/plain or openmetrics) or ?format=prometheus"""
+    accept = request.headers.get("accept", "")
+    if format == "prometheus" or (format is None and ("text/plain" in accept or "openmetrics" in accept)):
+        return PlainTextResponse(get_registry().render_prometheus(), media_type="text/plain; version=0.0.4")
+    return FastJSONResponse(agent.get_metrics())
 
 @app.get("/")
 async def root():
@@ -196,7 +822,12 @@ async def root():
         "status": "running",
         "endpoints": {
             "chat": "/chat",
+            "chat_batch": "/chat/batch",
+            "chat_stream": "/chat/stream",
+            "chat_ws": "/ws/chat",
             "health": "/health",
+            "health_live": "/health/live",
+            "health_ready": "/health/ready",
             "metrics": "/metrics",
             "docs": "/docs"
         }
@@ -213,6 +844,7 @@ Starting server...
 API Docs: http://localhost:8000/docs
 Health: http://localhost:8000/health
 Metrics: http://localhost:8000/metrics
-
+    
     """)
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Uvicorn's own wait for open connections gets the same deadline as the drain in lifespan
+    uvicorn.run(app, host="0.0.0.0", port=8000, timeout_graceful_shutdown=int(DRAIN_TIMEOUT_SECONDS))
\ No newline at end of file
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import admission, circuit_breaker, scheduler, user_limits
+
+class Clock:
+    """Stands in for the `time` module; tests move time forward by setting `now`"""
+    def __init__(self, now: float = 6000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    # 6000s is the start of a 60s window, which the sliding-window limiter tests rely on
+    clock = Clock()
+    for module in (admission, circuit_breaker, scheduler, user_limits):
+        monkeypatch.setattr(module, "time", clock)
+    return clock
@@ -0,0 +1,68 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import admission
+from common.admission import AdmissionController, OverloadedError
+
+def shed(controller: AdmissionController) -> OverloadedError:
+    with pytest.raises(OverloadedError) as info:
+        with controller.llm_slot():
+            pass
+    return info.value
+
+def test_concurrency_cap_sheds_with_429():
+    controller = AdmissionController(max_llm_in_flight=2, latency_slo=5)
+    shed_before = controller.shed["concurrency"].value
+
+    with controller.llm_slot(), controller.llm_slot():
+        error = shed(controller)
+        assert error.status_code == 429 and error.retry_after == 1
+    assert controller.shed["concurrency"].value == shed_before + 1
+
+    with controller.llm_slot():
+        pass
+
+def test_slot_is_freed_when_the_call_fails():
+    controller = AdmissionController(max_llm_in_flight=1, latency_slo=5)
+    with pytest.raises(RuntimeError):
+        with controller.llm_slot():
+            raise RuntimeError("upstream down")
+    assert controller.llm_in_flight == 0
+
+def test_latency_ewma_tracks_slot_duration(clock):
+    controller = AdmissionController(latency_slo=5, smoothing=0.5)
+    for _ in range(2):
+        with controller.llm_slot():
+            clock.now += 4.0
+    assert controller.latency_ewma == pytest.approx(3.0)
+    assert controller.retry_after() == 3
+
+def test_latency_over_slo_sheds_in_proportion(monkeypatch):
+    controller = AdmissionController(latency_slo=4, max_shed_ratio=0.9)
+    controller.latency_ewma = 6.0  # 50% over the SLO
+
+    monkeypatch.setattr(admission.random, "random", lambda: 0.4)
+    error = shed(controller)
+    assert error.status_code == 503 and error.retry_after == 6
+
+    monkeypatch.setattr(admission.random, "random", lambda: 0.6)
+    with controller.llm_slot():
+        pass
+
+def test_latency_shedding_never_rejects_everything(monkeypatch):
+    controller = AdmissionController(latency_slo=1, max_shed_ratio=0.9)
+    controller.latency_ewma = 100.0
+
+    monkeypatch.setattr(admission.random, "random", lambda: 0.95)
+    with controller.llm_slot():
+        pass
+
+def test_latency_under_slo_is_never_shed(monkeypatch):
+    controller = AdmissionController(latency_slo=5)
+    controller.latency_ewma = 4.9
+    monkeypatch.setattr(admission.random, "random", lambda: 0.0)
+    with controller.llm_slot():
+        pass
@@ -0,0 +1,40 @@
+import os
+import sys
+import json
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.batching import generate_batch
+
+class StubClient:
+    """Answers packed requests by echoing every item, or raises for the packed calls listed in fail_batches"""
+    def __init__(self, fail_batches=(), fail_prompts=()):
+        self.fail_batches = set(fail_batches)
+        self.fail_prompts = set(fail_prompts)
+        self.batches = 0
+        self.single = []
+
+    def generate(self, prompt: str, max_output_tokens: int = 150, json_output: bool = False) -> str:
+        if json_output:
+            index = self.batches
+            self.batches += 1
+            if index in self.fail_batches:
+                raise httpx.ReadTimeout("batch timed out")
+            items = json.loads(prompt.split("Items:\n", 1)[1])
+            return json.dumps([{"id": item["id"], "response": f"batch {item['prompt']}"} for item in items])
+
+        self.single.append(prompt)
+        if prompt in self.fail_prompts:
+            raise httpx.ConnectError("refused")
+        return f"single {prompt}"
+
+def test_failed_chunk_falls_back_per_item_and_keeps_other_chunks():
+    client = StubClient(fail_batches={1})
+    answers = generate_batch(client, ["a", "b", "c", "d", "e", "f"], max_batch_size=2)
+    assert answers == ["batch a", "batch b", "single c", "single d", "batch e", "batch f"]
+    assert client.batches == 3 and client.single == ["c", "d"]
+
+def test_item_that_fails_alone_is_none():
+    client = StubClient(fail_batches={0}, fail_prompts={"b"})
+    assert generate_batch(client, ["a", "b"], max_batch_size=2) == ["single a", None]
@@ -0,0 +1,111 @@
+import os
+import sys
+import asyncio
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(failure_rate=0.5, slow_call_seconds=10, slow_call_rate=0.8, open_seconds=15,
+                          window_size=10, min_calls=4, half_open_calls=2)
+
+def trip(breaker: CircuitBreaker):
+    for _ in range(breaker.min_calls):
+        breaker.before_call()
+        breaker.record(True, 0.1)
+    assert breaker.state == OPEN
+
+def test_stays_closed_until_min_calls(breaker):
+    for _ in range(breaker.min_calls - 1):
+        breaker.record(True, 0.1)
+    assert breaker.state == CLOSED
+    breaker.record(True, 0.1)
+    assert breaker.state == OPEN
+
+def test_failure_rate_below_threshold_stays_closed(breaker):
+    for failed in (True, False, False, False, True, False):
+        breaker.record(failed, 0.1)
+    assert breaker.state == CLOSED
+
+def test_slow_calls_open_the_circuit(breaker):
+    for _ in range(breaker.min_calls):
+        breaker.record(False, 12.0)
+    assert breaker.state == OPEN
+
+def test_open_circuit_rejects_until_open_seconds_pass(breaker, clock):
+    trip(breaker)
+    assert breaker.rejecting()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.stats()["rejected"] == 2
+
+    clock.now += breaker.open_seconds
+    assert not breaker.rejecting()
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+
+def test_half_open_admits_a_limited_number_of_probes(breaker, clock):
+    trip(breaker)
+    clock.now += breaker.open_seconds
+    breaker.before_call()
+    breaker.before_call()
+    assert breaker.rejecting()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    # A probe that never reached Gemini hands its slot back
+    breaker.release()
+    assert not breaker.rejecting()
+
+def test_rejecting_does_not_take_a_probe_slot(breaker, clock):
+    trip(breaker)
+    clock.now += breaker.open_seconds
+    breaker.before_call()
+    for _ in range(5):
+        assert not breaker.rejecting()
+    breaker.before_call()
+
+def test_successful_probes_close_the_circuit(breaker, clock):
+    trip(breaker)
+    clock.now += breaker.open_seconds
+    for _ in range(breaker.half_open_calls):
+        breaker.before_call()
+        breaker.record(False, 0.1)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 0
+
+def test_failed_probe_reopens_the_circuit(breaker, clock):
+    trip(breaker)
+    clock.now += breaker.open_seconds
+    breaker.before_call()
+    breaker.record(True, 0.1)
+    assert breaker.state == OPEN
+    assert breaker.rejecting()
+    assert breaker.stats()["times_opened"] == 2
+
+def test_guard_counts_only_upstream_failures(breaker):
+    for _ in range(breaker.min_calls):
+        with pytest.raises(ValueError):
+            with breaker.guard():
+                raise ValueError("malformed body")
+    assert breaker.state == CLOSED
+
+    for _ in range(breaker.min_calls):
+        with pytest.raises(httpx.ConnectError):
+            with breaker.guard():
+                raise httpx.ConnectError("connection refused")
+    assert breaker.state == OPEN
+
+def test_guard_releases_a_cancelled_probe(breaker, clock):
+    trip(breaker)
+    clock.now += breaker.open_seconds
+    for _ in range(breaker.half_open_calls + 1):
+        with pytest.raises(asyncio.CancelledError):
+            with breaker.guard():
+                raise asyncio.CancelledError()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.rejecting()
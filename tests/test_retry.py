@@ -0,0 +1,144 @@
+import os
+import sys
+import asyncio
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.rate_limit import QueueTimeoutError
+from common.retry import RetryPolicy, is_retryable
+
+def status_error(code: int, retry_after: str = None) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://example.invalid")
+    headers = {"retry-after": retry_after} if retry_after else {}
+    return httpx.HTTPStatusError("upstream", request=request, response=httpx.Response(code, headers=headers,
+                                                                                      request=request))
+
+class Flaky:
+    """Raises the queued errors in order, then returns "ok"; records the remaining seconds it was given"""
+    def __init__(self, *errors: Exception):
+        self.errors = list(errors)
+        self.remaining = []
+
+    def __call__(self, remaining: float) -> str:
+        self.remaining.append(remaining)
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+@pytest.mark.parametrize("error, retryable", [
+    (status_error(429), True),
+    (status_error(503), True),
+    (status_error(400), False),
+    (status_error(404), False),
+    (httpx.ConnectError("connection refused"), True),
+    (asyncio.TimeoutError(), True),
+    (QueueTimeoutError("rate limiter queue"), False),
+    (ValueError("malformed body"), False),
+])
+def test_error_classification(error, retryable):
+    assert is_retryable(error) is retryable
+
+def test_retries_transient_errors_until_success():
+    policy = RetryPolicy(max_attempts=3, base_delay=0)
+    fn = Flaky(httpx.ConnectError("reset"), status_error(502))
+    assert policy.call(fn) == "ok"
+    assert policy.attempts == 3 and policy.retries == 2
+
+def test_non_retryable_error_is_raised_at_once():
+    policy = RetryPolicy(max_attempts=3, base_delay=0)
+    with pytest.raises(QueueTimeoutError):
+        policy.call(Flaky(QueueTimeoutError("rate limiter queue")))
+    assert policy.attempts == 1 and policy.retries == 0
+
+def test_gives_up_after_max_attempts():
+    policy = RetryPolicy(max_attempts=2, base_delay=0)
+    with pytest.raises(httpx.HTTPStatusError):
+        policy.call(Flaky(status_error(503), status_error(503), status_error(503)))
+    assert policy.attempts == 2
+
+def test_retry_that_would_overrun_the_deadline_is_not_attempted():
+    policy = RetryPolicy(max_attempts=5, base_delay=0, deadline=30)
+    fn = Flaky(status_error(429, retry_after="60"))
+    with pytest.raises(httpx.HTTPStatusError):
+        policy.call(fn)
+    assert policy.attempts == 1 and policy.deadline_exceeded == 1
+    assert 0 < fn.remaining[0] <= 30
+
+def test_async_retries_share_one_deadline():
+    policy = RetryPolicy(max_attempts=3, base_delay=0, deadline=30)
+    flaky = Flaky(httpx.ReadTimeout("slow"))
+
+    async def fn(remaining: float) -> str:
+        return flaky(remaining)
+
+    assert asyncio.run(policy.acall(fn)) == "ok"
+    first, second = flaky.remaining
+    assert second <= first <= 30
+
+def hedging_policy() -> RetryPolicy:
+    policy = RetryPolicy(max_attempts=1, hedge=True, hedge_min_samples=1)
+    policy._latencies.append(0.01)  # p95 of 10ms, so the hedge fires almost at once
+    return policy
+
+def test_no_hedge_until_enough_samples():
+    policy = RetryPolicy(hedge=True, hedge_min_samples=2)
+    policy._latencies.append(0.01)
+    assert policy.hedge_delay() is None
+    policy._latencies.append(0.01)
+    assert policy.hedge_delay() == 0.01
+
+def test_hedge_winner_is_returned_and_the_loser_cancelled():
+    policy = hedging_policy()
+    calls = []
+    cancelled = []
+
+    async def fn(remaining: float) -> str:
+        index = len(calls)
+        calls.append(remaining)
+        if index == 0:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(index)
+                raise
+            return "first"
+        return "second"
+
+    async def main():
+        result = await policy.acall(fn)
+        await asyncio.sleep(0)  # let the cancellation reach the losing request
+        return result
+
+    assert asyncio.run(main()) == "second"
+    assert cancelled == [0]
+    assert policy.hedges == 1 and policy.hedge_wins == 1
+    assert calls[1] < calls[0]
+
+def test_fast_first_request_is_not_hedged():
+    policy = hedging_policy()
+    policy._latencies[0] = 5.0
+    calls = []
+
+    async def fn(remaining: float) -> str:
+        calls.append(remaining)
+        return "first"
+
+    assert asyncio.run(policy.acall(fn)) == "first"
+    assert len(calls) == 1 and policy.hedges == 0
+
+def test_hedge_error_waits_for_the_other_request():
+    policy = hedging_policy()
+    calls = []
+
+    async def fn(remaining: float) -> str:
+        index = len(calls)
+        calls.append(index)
+        if index == 0:
+            await asyncio.sleep(0.05)
+            return "first"
+        raise httpx.ConnectError("refused")
+
+    assert asyncio.run(policy.acall(fn)) == "first"
+    assert policy.hedges == 1 and policy.hedge_wins == 0
@@ -0,0 +1,80 @@
+import os
+import sys
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.scheduler import PriorityScheduler
+
+def dispatch_order(sched: PriorityScheduler, waiters: list[tuple[str, str]], after_queued=None,
+                   before_release=None) -> list[str]:
+    """Hold every slot, queue `waiters` as (priority, user_id) in order, then free one slot and record who runs"""
+    order = []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def hold():
+            async with sched.slot("low", "holder"):
+                await release.wait()
+
+        async def wait(priority: str, user_id: str):
+            async with sched.slot(priority, user_id):
+                order.append(f"{priority}:{user_id}")
+
+        holders = [asyncio.create_task(hold()) for _ in range(sched.concurrency)]
+        await asyncio.sleep(0)
+        tasks = []
+        for priority, user_id in waiters:
+            tasks.append(asyncio.create_task(wait(priority, user_id)))
+            await asyncio.sleep(0)
+            if after_queued:
+                after_queued(len(tasks) - 1)
+        if before_release:
+            before_release(tasks)
+            await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*holders, *tasks, return_exceptions=True)
+
+    asyncio.run(main())
+    return order
+
+def test_free_slots_are_taken_without_queueing():
+    sched = PriorityScheduler(concurrency=2)
+
+    async def main():
+        async with sched.slot("low", "a"), sched.slot("low", "b"):
+            assert sched.available == 0 and sched.queue_depth == 0
+        assert sched.available == 2
+
+    asyncio.run(main())
+
+def test_higher_priority_gets_more_of_the_freed_slots():
+    sched = PriorityScheduler(concurrency=1, weights={"high": 3, "low": 1}, max_wait=60)
+    waiters = [("low", f"l{i}") for i in range(4)] + [("high", f"h{i}") for i in range(4)]
+    # Three high for every low while both classes have work queued; low still gets its share
+    assert dispatch_order(sched, waiters) == [
+        "high:h0", "low:l0", "high:h1", "high:h2", "high:h3", "low:l1", "low:l2", "low:l3"
+    ]
+
+def test_users_take_turns_within_a_class():
+    sched = PriorityScheduler(concurrency=1, max_wait=60)
+    order = dispatch_order(sched, [("low", "a"), ("low", "a"), ("low", "a"), ("low", "b")])
+    assert order == ["low:a", "low:b", "low:a", "low:a"]
+
+def test_waiters_past_max_wait_go_first(clock):
+    sched = PriorityScheduler(concurrency=1, weights={"high": 100, "low": 1}, max_wait=2)
+    aged = sched.classes["low"].aged.value
+
+    def advance(index: int):
+        if index == 0:
+            clock.now += 5  # the low waiter has been queued past max_wait before the high ones arrive
+
+    order = dispatch_order(sched, [("low", "old"), ("high", "a"), ("high", "b")], after_queued=advance)
+    assert order == ["low:old", "high:a", "high:b"]
+    assert sched.classes["low"].aged.value == aged + 1
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    sched = PriorityScheduler(concurrency=1, max_wait=60)
+    order = dispatch_order(sched, [("low", "gone"), ("low", "b")], before_release=lambda tasks: tasks[0].cancel())
+    assert order == ["low:b"]
+    assert sched.available == 1 and sched.queue_depth == 0
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.semantic_cache import SemanticCache
+
+@pytest.mark.parametrize("cached, asked", [
+    ("How do I reset my password?", "how can i reset my password"),
+    ("How do I cancel my order?", "I need to cancel my order please"),
+    ("Where is my package?", "where's my package"),
+    ("I was charged twice for my order", "I got charged twice for my order"),
+])
+def test_paraphrase_is_served(cached, asked):
+    cache = SemanticCache()
+    cache.add(cached, "cached answer")
+    assert cache.get(asked) == "cached answer"
+
+@pytest.mark.parametrize("cached, asked", [
+    ("I was charged twice for my order", "I was not charged for my order"),
+    ("Can I change my shipping address?", "Can I change my billing address?"),
+    ("How do I cancel my order?", "How do I not cancel my order?"),
+    ("I want a refund", "I don't want a refund"),
+    ("How do I reset my password?", "How do I reset my username?"),
+    ("Can I move my order from express to standard shipping?", "Can I move my order from standard to express shipping?"),
+    ("Can I switch my plan from monthly to annual billing next month?",
+     "Can I switch my plan from annual to monthly billing next month?"),
+])
+def test_near_miss_is_not_served(cached, asked):
+    cache = SemanticCache()
+    cache.add(cached, "cached answer")
+    assert cache.get(asked) is None
+
+def test_stopword_only_message_is_not_served():
+    cache = SemanticCache()
+    cache.add("how are you", "cached answer")
+    assert cache.get("who are you") is None
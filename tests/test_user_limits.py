@@ -0,0 +1,108 @@
+import os
+import sys
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.user_limits import LocalWindowStore, RateLimitedError, RequestLimits, SlidingWindowLimiter
+
+WINDOW = 60.0
+
+def hit(limiter: SlidingWindowLimiter, key: str = "user:a", times: int = 1):
+    for _ in range(times):
+        asyncio.run(limiter.check(key))
+
+def retry_after(limiter: SlidingWindowLimiter, key: str = "user:a") -> int:
+    with pytest.raises(RateLimitedError) as info:
+        hit(limiter, key)
+    assert info.value.status_code == 429
+    return info.value.retry_after
+
+def test_limit_within_one_window(clock):
+    limiter = SlidingWindowLimiter(3, WINDOW, LocalWindowStore())
+    clock.now += 15
+    hit(limiter, times=3)
+    # Nothing in the previous window, so the only way out is the next window starting
+    assert retry_after(limiter) == 45
+
+def test_previous_window_counts_by_overlap(clock):
+    limiter = SlidingWindowLimiter(4, WINDOW, LocalWindowStore())
+    hit(limiter, times=4)
+
+    # Halfway into the next window the previous four still weigh two, leaving room for two more
+    clock.now += 1.5 * WINDOW
+    hit(limiter, times=2)
+    # One over: a quarter of the previous window's four has to slide out first
+    assert retry_after(limiter) == 15
+
+    clock.now += 15
+    hit(limiter)
+
+def test_windows_older_than_the_previous_one_are_forgotten(clock):
+    limiter = SlidingWindowLimiter(2, WINDOW, LocalWindowStore())
+    hit(limiter, times=2)
+    clock.now += 2 * WINDOW
+    hit(limiter, times=2)
+
+def test_rejected_requests_are_not_counted(clock):
+    limiter = SlidingWindowLimiter(2, WINDOW, LocalWindowStore())
+    hit(limiter, times=2)
+    for _ in range(5):
+        retry_after(limiter)
+
+    clock.now += 1.5 * WINDOW
+    hit(limiter)  # the previous window weighs 2 * 0.5, not (2 + 5) * 0.5
+
+def test_retry_after_is_at_least_one_second(clock):
+    limiter = SlidingWindowLimiter(1, WINDOW, LocalWindowStore())
+    clock.now += WINDOW - 0.1
+    hit(limiter)
+    assert retry_after(limiter) == 1
+
+def test_keys_are_limited_separately(clock):
+    limiter = SlidingWindowLimiter(1, WINDOW, LocalWindowStore())
+    hit(limiter, "user:a")
+    hit(limiter, "user:b")
+    retry_after(limiter, "user:a")
+
+def test_zero_limit_disables_the_check(clock):
+    limits = RequestLimits(user_limit=0, session_limit=0, window_seconds=WINDOW, store=LocalWindowStore())
+    for _ in range(100):
+        asyncio.run(limits.check("a", "s"))
+
+def test_session_limit_is_scoped_to_the_user(clock):
+    limits = RequestLimits(user_limit=100, session_limit=1, window_seconds=WINDOW, store=LocalWindowStore())
+    rejected = limits.rejected["session"].value
+
+    asyncio.run(limits.check("a", "shared"))
+    asyncio.run(limits.check("b", "shared"))
+    with pytest.raises(RateLimitedError):
+        asyncio.run(limits.check("a", "shared"))
+    assert limits.rejected["session"].value == rejected + 1
+
+def test_session_key_cannot_be_forged_with_separators(clock):
+    limits = RequestLimits(user_limit=100, session_limit=1, window_seconds=WINDOW, store=LocalWindowStore())
+    asyncio.run(limits.check("a:b", "c"))
+    asyncio.run(limits.check("a", "b:c"))
+
+def test_user_limit_applies_across_sessions(clock):
+    limits = RequestLimits(user_limit=2, session_limit=10, window_seconds=WINDOW, store=LocalWindowStore())
+    asyncio.run(limits.check("a", "one"))
+    asyncio.run(limits.check("a", "two"))
+    with pytest.raises(RateLimitedError):
+        asyncio.run(limits.check("a", "three"))
+
+class FailingStore:
+    async def counts(self, key: str, window: int) -> tuple[int, int]:
+        raise ConnectionError("redis is down")
+
+    async def incr(self, key: str, window: int, ttl: int):
+        raise ConnectionError("redis is down")
+
+def test_store_errors_let_the_request_through(clock):
+    limits = RequestLimits(user_limit=1, session_limit=1, window_seconds=WINDOW, store=FailingStore())
+    errors = limits.stats()["store_errors"]
+    for _ in range(3):
+        asyncio.run(limits.check("a", "s"))
+    assert limits.stats()["store_errors"] == errors + 6